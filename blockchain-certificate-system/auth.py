@@ -0,0 +1,172 @@
+"""
+Password Authentication
+Runs bcrypt on a bounded worker pool so a burst of logins cannot tie up
+every request thread, throttles repeated bad passwords per account, and
+upgrades stored hashes to the configured cost on successful login.
+"""
+
+import logging
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from threading import BoundedSemaphore, Lock
+
+import bcrypt
+
+from config import (BCRYPT_ROUNDS, AUTH_WORKERS, AUTH_QUEUE_LIMIT, AUTH_TIMEOUT,
+                    LOGIN_MAX_FAILURES, LOGIN_LOCKOUT_SECONDS)
+
+logger = logging.getLogger(__name__)
+
+# Tracked accounts beyond which the oldest idle entries are evicted
+LOCKOUT_TABLE_SIZE = 100000
+
+
+class AuthBusy(Exception):
+    """Too many password checks are already queued"""
+    pass
+
+
+class AccountLocked(Exception):
+    """Too many failed attempts for this account"""
+
+    def __init__(self, retry_after):
+        self.retry_after = int(retry_after) + 1
+        super().__init__(f"Too many failed attempts. Try again in {self.retry_after} seconds.")
+
+
+_executor = ThreadPoolExecutor(max_workers=AUTH_WORKERS, thread_name_prefix="auth")
+_slots = BoundedSemaphore(AUTH_WORKERS + AUTH_QUEUE_LIMIT)
+
+
+def _run(fn, *args):
+    """Run fn on the auth pool, or raise AuthBusy if the queue is full"""
+    if not _slots.acquire(blocking=False):
+        raise AuthBusy("The server is busy signing in other users. Please try again in a moment.")
+    try:
+        future = _executor.submit(fn, *args)
+    except Exception:
+        _slots.release()
+        raise
+    future.add_done_callback(lambda _: _slots.release())
+    try:
+        return future.result(timeout=AUTH_TIMEOUT)
+    except FutureTimeout:
+        raise AuthBusy("Sign-in timed out. Please try again in a moment.")
+
+
+def hash_password(password, rounds=None):
+    """bcrypt hash of a password at the configured cost"""
+    return bcrypt.hashpw(password.encode('utf-8'),
+                         bcrypt.gensalt(rounds or BCRYPT_ROUNDS)).decode('utf-8')
+
+
+def _check(password, hashed):
+    return bcrypt.checkpw(password.encode('utf-8'), hashed.encode('utf-8'))
+
+
+def hash_rounds(hashed):
+    """Cost factor stored in a bcrypt hash ($2b$12$...)"""
+    try:
+        return int(hashed.split('$')[2])
+    except (AttributeError, IndexError, ValueError):
+        return None
+
+
+class LoginThrottle:
+    """In-memory failed-attempt counters with temporary lockout.
+
+    Failures count for lockout_seconds after the most recent one. Entries are
+    kept in least-recently-failed order; beyond max_entries only entries whose
+    failures have aged out are evicted, so flooding the table with bogus IDs
+    cannot reset a real account's counter.
+    """
+
+    def __init__(self, max_failures=LOGIN_MAX_FAILURES, lockout_seconds=LOGIN_LOCKOUT_SECONDS,
+                 max_entries=LOCKOUT_TABLE_SIZE):
+        self.max_failures = max_failures
+        self.lockout_seconds = lockout_seconds
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = Lock()
+
+    def check(self, key):
+        """Raise AccountLocked while key is locked out"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if not entry:
+                return
+            failures, locked_until, last_failure = entry
+            now = time.monotonic()
+            if locked_until and locked_until > now:
+                raise AccountLocked(locked_until - now)
+            if locked_until or self._expired(last_failure, now):
+                # Lockout over or failures aged out: start counting again
+                del self._entries[key]
+
+    def failure(self, key):
+        with self._lock:
+            now = time.monotonic()
+            failures, _, last_failure = self._entries.pop(key, (0, None, now))
+            if self._expired(last_failure, now):
+                failures = 0
+            failures += 1
+            locked_until = None
+            if failures >= self.max_failures:
+                locked_until = now + self.lockout_seconds
+            self._entries[key] = (failures, locked_until, now)
+            if len(self._entries) > self.max_entries:
+                self._prune(now)
+
+    def success(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def _expired(self, last_failure, now):
+        return now - last_failure >= self.lockout_seconds
+
+    def _prune(self, now):
+        # Oldest first; stop at the first entry still inside its window since
+        # everything after it failed more recently
+        while len(self._entries) > self.max_entries:
+            key, (_, _, last_failure) = next(iter(self._entries.items()))
+            if not self._expired(last_failure, now):
+                break
+            del self._entries[key]
+
+
+login_throttle = LoginThrottle()
+
+
+def authenticate(collection, id_field, user_id, password):
+    """Check a password for the active account user_id in collection.
+
+    Returns the account document or None. Raises AccountLocked or AuthBusy,
+    whose messages are meant for the user.
+    """
+    user_id = user_id.upper()
+    key = (collection.name, user_id)
+    login_throttle.check(key)
+
+    account = collection.find_one({id_field: user_id, "Status": "Active"})
+    if not account or not account.get('Password'):
+        login_throttle.failure(key)
+        return None
+
+    if not _run(_check, password, account['Password']):
+        login_throttle.failure(key)
+        return None
+
+    login_throttle.success(key)
+
+    if hash_rounds(account['Password']) != BCRYPT_ROUNDS:
+        # Transparently move the stored hash to the configured cost
+        try:
+            new_hash = _run(hash_password, password)
+            collection.update_one({"_id": account["_id"], "Password": account['Password']},
+                                  {"$set": {"Password": new_hash}})
+        except AuthBusy:
+            pass
+        except Exception as e:
+            logger.error(f"Password rehash failed for {user_id}: {e}")
+    return account
@@ -6,19 +6,35 @@ from PIL import Image, ImageDraw, ImageFont
 import hashlib
 import datetime
 import logging
+import re
 from threading import Lock
-from config import certificates_col
+from pymongo.errors import BulkWriteError
+from config import certificates_col, BATCH_VERIFY_CHUNK_SIZE
+from models import certificate_projection, anchored, Stats, stamp_changes, delete_synced
+from chainstore import (NODE_NAMES, BATCH_BLOCK_TYPE, node_path, block_hash,
+                        NodeSelector, ChainUnavailable, chain_lock)
+from feed import block_feed
+from cache import certificate_cache, invalidate_certificate
+from bloom import certificate_filter
+from search import SEARCH_FIELDS, search_tokens, token_query, match_certificate, search_limit
 
 VERIFICATION_URL = "http://127.0.0.1:5000/verify/"
 
 logger = logging.getLogger(__name__)
 
+_CERTIFICATE_HASH = re.compile(r"^[0-9a-f]{64}$")
+
+def is_certificate_hash(value):
+    """True if value looks like a certificate hash rather than a USN"""
+    return bool(_CERTIFICATE_HASH.match(value.lower()))
+
 class BlockchainError(Exception):
     """Custom blockchain exception"""
     pass
 
 class BlockChain:
     _lock = Lock()
+    _nodes = NodeSelector()
     
     def __init__(self):
         pass
@@ -50,21 +66,30 @@ class BlockChain:
 
         # Store in MongoDB
         try:
-            result = certificates_col.insert_one(data.copy())
+            document = dict(data, SearchTokens=search_tokens(data))
+            result = certificates_col.insert_one(document)
             logger.info(f"✓ Certificate stored in MongoDB with ID: {result.inserted_id}")
         except Exception as e:
             logger.error(f"✗ MongoDB insertion failed: {e}")
             return None
         
+        stamp_changes(certificates_col, [result.inserted_id])
+        Stats.increment(data["CollegeID"], department, certificates=1, pending_blocks=1)
+        certificate_filter.add(proHash)
+        
         # Create blockchain block
         try:
             self.createBlock(data)
         except BlockchainError as e:
             logger.error(f"✗ Blockchain creation failed: {e}")
-            # Rollback MongoDB insert
-            certificates_col.delete_one({"hash": proHash})
+            # Rollback MongoDB insert; mirrors that already synced it get a delete
+            delete_synced(certificates_col, "certificate", "hash", [proHash])
+            invalidate_certificate(proHash)
+            Stats.increment(data["CollegeID"], department, certificates=-1, pending_blocks=-1)
             return None
         
+        Stats.increment(data["CollegeID"], department, pending_blocks=-1)
+        
         # Generate QR code with enhanced design
         imgName = self.imgNameFormatting(student_name)
         qr_path = self.createEnhancedQR(proHash, student_name, usn, imgName)
@@ -75,10 +100,107 @@ class BlockChain:
         
         return proHash
     
-    def read_chain(self, node='N1'):
-        """Read blockchain from file"""
+    def storeCertificateBatch(self, certificates, batch_id):
+        """Insert prepared certificates (data dicts with hash) of one batch.
+        
+        Returns {index: error} for the certificates that were not stored.
+        They are stored as Pending, so lookups and verification skip them
+        until anchorCertificateBatch writes their block, and they get their
+        change sequence numbers (delta sync) only then.
+        """
+        documents = [dict(data, SearchTokens=search_tokens(data), BatchID=batch_id, Pending=True)
+                     for data in certificates]
+        failed = {}
+        try:
+            certificates_col.insert_many(documents, ordered=False)
+        except BulkWriteError as e:
+            for error in e.details.get("writeErrors", []):
+                failed[error["index"]] = error.get("errmsg", "Write failed")
+        except Exception as e:
+            logger.error(f"✗ MongoDB batch insertion failed: {e}")
+            failed = {index: "Database error" for index in range(len(documents))}
+        
+        counts = {}
+        for index, data in enumerate(certificates):
+            if index not in failed:
+                key = (data["CollegeID"], data["Department"])
+                counts[key] = counts.get(key, 0) + 1
+        for (college_id, department), count in counts.items():
+            Stats.increment(college_id, department, certificates=count, pending_blocks=count)
+        return failed
+    
+    def anchorCertificateBatch(self, batch_id, college_id, entries):
+        """Anchor stored batch certificates with one manifest block.
+        
+        entries: dicts with hash, USN, Studentname, Department and FileSHA256.
+        Once the block is written the certificates lose their Pending mark and
+        become verifiable. On failure they are removed from MongoDB again.
+        """
+        manifest = {
+            "Type": BATCH_BLOCK_TYPE,
+            "BatchID": batch_id,
+            "CollegeID": college_id.upper(),
+            "Certificates": [
+                {"hash": entry["hash"], "USN": entry["USN"], "CollegeID": college_id.upper(),
+                 "FileSHA256": entry["FileSHA256"]}
+                for entry in entries
+            ],
+            "CreatedAt": str(datetime.datetime.now())
+        }
+        
+        counts = {}
+        for entry in entries:
+            counts[entry["Department"]] = counts.get(entry["Department"], 0) + 1
+        
+        try:
+            self.createBlock(manifest)
+        except BlockchainError as e:
+            logger.error(f"✗ Blockchain creation failed for batch {batch_id}: {e}")
+            self.discardCertificateBatch(college_id, entries)
+            return False
+        
+        hashes = [entry["hash"] for entry in entries]
+        certificates_col.update_many({"hash": {"$in": hashes}}, {"$unset": {"Pending": ""}})
+        for cert_hash in hashes:
+            # A lookup while the batch was pending may have cached "not found"
+            invalidate_certificate(cert_hash)
+            certificate_filter.add(cert_hash)
+        
+        for department, count in counts.items():
+            Stats.increment(college_id, department, pending_blocks=-count)
+        
+        stamp_changes(certificates_col, hashes, field="hash")
+        
+        for entry in entries:
+            self.createEnhancedQR(entry["hash"], entry["Studentname"], entry["USN"],
+                                  self.imgNameFormatting(entry["Studentname"]))
+        logger.info(f"✓ Batch {batch_id}: {len(entries)} certificates anchored in one block")
+        return True
+    
+    def discardCertificateBatch(self, college_id, entries):
+        """Remove stored batch certificates that were never anchored"""
+        hashes = [entry["hash"] for entry in entries]
+        delete_synced(certificates_col, "certificate", "hash", hashes)
+        for cert_hash in hashes:
+            invalidate_certificate(cert_hash)
+        
+        counts = {}
+        for entry in entries:
+            counts[entry["Department"]] = counts.get(entry["Department"], 0) + 1
+        for department, count in counts.items():
+            Stats.increment(college_id, department, certificates=-count, pending_blocks=-count)
+    
+    def read_chain(self, node=None):
+        """Read blockchain from a specific node, or from any healthy majority node"""
+        if node is None:
+            try:
+                _, chain = self._nodes.read()
+                return chain
+            except ChainUnavailable as e:
+                raise BlockchainError(str(e))
+        
         try:
-            filepath = f'./NODES/{node}/blockchain.json'
+            filepath = node_path(node)
             if not os.path.exists(filepath):
                 return []
             
@@ -89,17 +211,21 @@ class BlockChain:
                 return json.loads(content)
         except json.JSONDecodeError as e:
             logger.error(f"Invalid JSON in blockchain file: {e}")
+            self._nodes.mark_failed(node, e)
             return []
         except Exception as e:
             logger.error(f"Error reading blockchain: {e}")
+            self._nodes.mark_failed(node, e)
             return []
     
+    def node_health(self):
+        """Per-node read health"""
+        return self._nodes.health()
+    
     def write_chain(self, chain):
         """Write blockchain to all nodes atomically"""
-        nodes = ['N1', 'N2', 'N3', 'N4']
-        
-        for node in nodes:
-            filepath = f'./NODES/{node}/blockchain.json'
+        for node in NODE_NAMES:
+            filepath = node_path(node)
             temp_filepath = filepath + '.tmp'
             
             try:
@@ -118,17 +244,16 @@ class BlockChain:
     
     def createBlock(self, data):
         """Create blockchain block with proper locking"""
-        with self._lock:
+        with self._lock, chain_lock():
             try:
-                # Read current chain
-                chain = self.read_chain('N1')
+                # Read current chain from a healthy node; rewriting all
+                # nodes below also repairs any node that failed to read
+                chain = self.read_chain()
                 
                 if chain:
                     preBlock = chain[-1]
                     index = preBlock["index"] + 1
-                    preHash = hashlib.sha256(
-                        json.dumps(preBlock, sort_keys=True).encode()
-                    ).hexdigest()
+                    preHash = block_hash(preBlock)
                 else:
                     index = 1
                     preHash = "0"
@@ -152,6 +277,9 @@ class BlockChain:
                 # Write to all nodes
                 self.write_chain(chain)
                 
+                # Push the new header to feed subscribers
+                block_feed.publish(transaction, data if isinstance(data, dict) else None)
+                
                 logger.info("✓ Block added to blockchain")
                 
             except BlockchainError:
@@ -162,11 +290,13 @@ class BlockChain:
     
     def proof_of_work(self, previous_hash, data, difficulty=4):
         """Simple proof-of-work algorithm"""
+        # Hash the fixed prefix once; each attempt only adds the proof digits
+        prefix = hashlib.sha256(f"{previous_hash}{data}".encode())
         proof = 0
         while True:
-            hash_attempt = hashlib.sha256(
-                f"{previous_hash}{data}{proof}".encode()
-            ).hexdigest()
+            attempt = prefix.copy()
+            attempt.update(str(proof).encode())
+            hash_attempt = attempt.hexdigest()
             if hash_attempt[:difficulty] == "0" * difficulty:
                 return proof
             proof += 1
@@ -181,9 +311,7 @@ class BlockChain:
                 logger.error("Invalid block index")
                 return False
             
-            expected_hash = hashlib.sha256(
-                json.dumps(previous_block, sort_keys=True).encode()
-            ).hexdigest()
+            expected_hash = block_hash(previous_block)
             
             if block['previous_hash'] != expected_hash:
                 logger.error("Invalid previous hash")
@@ -290,8 +418,8 @@ class BlockChain:
         """Verify blockchain integrity across all nodes"""
         try:
             hashes = []
-            for i in range(1, 5):
-                chain = self.read_chain(f'N{i}')
+            for node in NODE_NAMES:
+                chain = self.read_chain(node)
                 chain_hash = hashlib.sha256(
                     json.dumps(chain, sort_keys=True).encode()
                 ).hexdigest()
@@ -303,52 +431,128 @@ class BlockChain:
             logger.error(f"Error validating blockchain: {e}")
             return False
 
-    def getCertificateByHash(self, cert_hash):
-        """Get certificate by hash"""
+    def getCertificateByHash(self, cert_hash, fields="detail"):
+        """Get certificate by hash (detail lookups are served from the LRU cache)"""
+        if fields == "detail":
+            cached = certificate_cache.get(cert_hash)
+            if cached is not None:
+                return dict(cached)
         try:
-            certificate = certificates_col.find_one({"hash": cert_hash})
+            certificate = certificates_col.find_one(anchored({"hash": cert_hash}),
+                                                    certificate_projection(fields))
+            if certificate and fields == "detail":
+                certificate_cache.set(cert_hash, dict(certificate))
             return certificate
         except Exception as e:
             logger.error(f"✗ MongoDB query failed: {e}")
             return None
     
-    def getCertificateByUSN(self, usn):
-        """Get all certificates by USN"""
+    def certificateExists(self, cert_hash):
+        """Check that a certificate hash is stored and anchored (True if unsure)"""
         try:
-            certificates = list(certificates_col.find({"USN": usn.upper()}))
+            return certificates_col.find_one(anchored({"hash": cert_hash}), {"_id": 0, "hash": 1}) is not None
+        except Exception as e:
+            logger.error(f"✗ MongoDB query failed: {e}")
+            return True
+    
+    def getCertificateByUSN(self, usn, fields="list", college_ids=None):
+        """Get all certificates by USN, optionally only those issued by college_ids"""
+        try:
+            query = {"USN": usn.upper()}
+            if college_ids is not None:
+                query["CollegeID"] = {"$in": list(college_ids)}
+            certificates = list(certificates_col.find(anchored(query), certificate_projection(fields)))
             return certificates
         except Exception as e:
             logger.error(f"✗ MongoDB query failed: {e}")
             return []
     
-    def getCertificatesByCollegeID(self, college_id):
+    def verifyCertificates(self, identifiers, college_ids, fields="list",
+                           chunk_size=BATCH_VERIFY_CHUNK_SIZE):
+        """Resolve many USNs / certificate hashes issued by college_ids.
+        
+        Identifiers are resolved with one $in query per chunk and yielded in
+        input order as (identifier, kind, certificates), where kind is "usn"
+        or "hash" and certificates is None if the lookup failed.
+        """
+        college_ids = list(college_ids)
+        for start in range(0, len(identifiers), chunk_size):
+            chunk = identifiers[start:start + chunk_size]
+            keys = [(value.lower(), "hash") if is_certificate_hash(value) else (value.upper(), "usn")
+                    for value in chunk]
+            hashes = [key for key, kind in keys if kind == "hash"]
+            usns = [key for key, kind in keys if kind == "usn"]
+            
+            found = {}
+            try:
+                if college_ids:
+                    clauses = []
+                    if hashes:
+                        clauses.append({"hash": {"$in": hashes}})
+                    if usns:
+                        clauses.append({"USN": {"$in": usns}})
+                    query = anchored({"$or": clauses, "CollegeID": {"$in": college_ids}})
+                    for certificate in certificates_col.find(query, certificate_projection(fields)):
+                        found.setdefault(("hash", certificate["hash"]), []).append(certificate)
+                        found.setdefault(("usn", certificate["USN"]), []).append(certificate)
+            except Exception as e:
+                logger.error(f"✗ Batch verification query failed: {e}")
+                found = None
+            
+            for value, (key, kind) in zip(chunk, keys):
+                yield value, kind, None if found is None else found.get((kind, key), [])
+    
+    def getCertificatesByCollegeID(self, college_id, fields="list"):
         """Get all certificates by college ID"""
         try:
-            certificates = list(certificates_col.find({"CollegeID": college_id.upper()}))
+            certificates = list(certificates_col.find(anchored({"CollegeID": college_id.upper()}),
+                                                      certificate_projection(fields)))
             return certificates
         except Exception as e:
             logger.error(f"✗ MongoDB query failed: {e}")
             return []
     
-    def searchCertificates(self, search_term, search_field="Studentname", college_id=None):
-        """Search certificates"""
+    def searchCertificates(self, search_term, search_field="Studentname", college_id=None,
+                           fields="list", limit=None):
+        """Search certificates through the SearchTokens index, best matches first.
+        
+        Each result carries a Score and Highlights ({field: [[start, end], ...]}).
+        """
+        if search_field != "all" and search_field not in SEARCH_FIELDS:
+            logger.error(f"✗ Unsupported search field: {search_field}")
+            return []
+        
+        limit = search_limit(limit)
         try:
-            query = {}
-            
-            if college_id:
-                query["CollegeID"] = college_id.upper()
-            
-            if search_field == "all":
-                query["$or"] = [
-                    {"Studentname": {"$regex": search_term, "$options": "i"}},
-                    {"USN": {"$regex": search_term, "$options": "i"}},
-                    {"Department": {"$regex": search_term, "$options": "i"}}
-                ]
-            else:
-                query[search_field] = {"$regex": search_term, "$options": "i"}
+            candidates = {}
+            # Exact word matches first, then prefix / partial matches
+            for exact in (True, False):
+                condition = token_query(search_term, search_field, exact)
+                if condition is None:
+                    return []
+                
+                query = [condition]
+                if college_id:
+                    query.append({"CollegeID": college_id.upper()})
+                if candidates:
+                    query.append({"hash": {"$nin": list(candidates)}})
+                
+                # Over-fetch so candidates rejected by the full-word check do not shrink the page
+                cursor = certificates_col.find(anchored({"$and": query}), certificate_projection(fields)) \
+                                         .limit(limit * 2)
+                for doc in cursor:
+                    match = match_certificate(doc, search_term, search_field)
+                    if match:
+                        doc["Score"], doc["Highlights"] = match
+                        candidates[doc["hash"]] = doc
+                
+                if len(candidates) >= limit:
+                    break
             
-            results = list(certificates_col.find(query))
-            return results
+            results = sorted(candidates.values(),
+                             key=lambda doc: (doc["Score"], doc.get("CreatedAt", "")),
+                             reverse=True)
+            return results[:limit]
         except Exception as e:
             logger.error(f"✗ Search failed: {e}")
             return []
\ No newline at end of file
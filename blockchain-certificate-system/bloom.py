@@ -0,0 +1,225 @@
+"""
+Bloom filter over issued certificate hashes
+Screens /verify/<hash> lookups: a positive goes straight to the certificate
+lookup, a negative (forged or mistyped hash) only needs an index-only
+existence check before the fraud page. The filter can lag certificates
+issued by other processes, so negatives are never trusted on their own.
+The filter is built from a streaming scan of
+the certificates collection, persisted to disk for fast warm starts, and
+kept current by issuance plus a background catch-up scan for certificates
+written by other processes. Lookups only ever read the in-memory filter.
+"""
+
+import atexit
+import datetime
+import hashlib
+import logging
+import math
+import os
+import struct
+import time
+from threading import Lock, Thread
+
+from bson import ObjectId
+
+from config import (certificates_col, BLOOM_FILE, BLOOM_CAPACITY,
+                    BLOOM_ERROR_RATE, BLOOM_REFRESH_SECONDS)
+
+logger = logging.getLogger(__name__)
+
+_MAGIC = b'BLM1'
+_HEADER = struct.Struct('>4sQIQ12s')
+
+# Catch-up scans re-read this far behind the high-water mark so documents
+# inserted with slightly older ObjectIds (clock skew between servers) are not missed
+_CATCH_UP_OVERLAP = datetime.timedelta(minutes=5)
+
+
+class BloomFilter:
+    def __init__(self, capacity, error_rate, bits=None, num_hashes=None, count=0):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.size = max(8, int(math.ceil(-capacity * math.log(error_rate) / (math.log(2) ** 2))))
+        self.num_hashes = num_hashes or max(1, int(round(self.size / capacity * math.log(2))))
+        self.bits = bits if bits is not None else bytearray((self.size + 7) // 8)
+        self.size = len(self.bits) * 8
+        self.count = count
+
+    def _positions(self, key):
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'big')
+        h2 = int.from_bytes(digest[8:], 'big') | 1
+        return [(h1 + i * h2) % self.size for i in range(self.num_hashes)]
+
+    def add(self, key):
+        for pos in self._positions(key):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
+
+    def __contains__(self, key):
+        return all(self.bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(key))
+
+
+class CertificateFilter:
+    """Bloom filter of certificate hashes with persistence and catch-up"""
+
+    def __init__(self, path=BLOOM_FILE, capacity=BLOOM_CAPACITY, error_rate=BLOOM_ERROR_RATE,
+                 refresh_seconds=BLOOM_REFRESH_SECONDS):
+        self.path = path
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.refresh_seconds = refresh_seconds
+        self._lock = Lock()
+        self._bloom = None
+        self._high_water = None
+        self._last_refresh = 0.0
+        self._dirty = False
+        self._building = None
+
+    @property
+    def ready(self):
+        return self._bloom is not None
+
+    def might_contain(self, cert_hash):
+        """False if the hash was not issued as of the last catch-up"""
+        bloom = self._bloom
+        if bloom is None:
+            return True
+        return cert_hash in bloom
+
+    def add(self, cert_hash):
+        """Record a newly issued certificate"""
+        with self._lock:
+            if self._building is not None:
+                self._building.append(cert_hash)
+            if self._bloom is not None:
+                self._bloom.add(cert_hash)
+                self._dirty = True
+
+    def _scan(self, bloom, after=None):
+        """Stream hashes into bloom; returns the highest _id seen"""
+        query = {"_id": {"$gt": after}} if after else {}
+        high_water = after
+        cursor = certificates_col.find(query, {"hash": 1}).sort("_id", 1).batch_size(5000)
+        for doc in cursor:
+            # Catch-up scans overlap; skip hashes already present so count stays accurate
+            if doc.get("hash") and doc["hash"] not in bloom:
+                bloom.add(doc["hash"])
+            high_water = doc["_id"]
+        return high_water
+
+    def build(self):
+        """Build the filter from a full scan of the certificates collection"""
+        with self._lock:
+            if self._building is not None:
+                return
+            self._building = []
+        try:
+            existing = certificates_col.estimated_document_count()
+            capacity = max(self.capacity, existing * 2)
+            bloom = BloomFilter(capacity, self.error_rate)
+            high_water = self._scan(bloom)
+        except Exception:
+            with self._lock:
+                self._building = None
+            raise
+        with self._lock:
+            # Hashes issued while the scan was running
+            for cert_hash in self._building:
+                bloom.add(cert_hash)
+            self._building = None
+            self._bloom = bloom
+            self._high_water = high_water
+            self._last_refresh = time.monotonic()
+            self._dirty = True
+        logger.info(f"✓ Certificate Bloom filter built with {bloom.count} hashes")
+        self.save()
+
+    def catch_up(self):
+        """Add certificates inserted since the last scan, possibly by other processes"""
+        with self._lock:
+            self._last_refresh = time.monotonic()
+            bloom, high_water = self._bloom, self._high_water
+        if bloom is None:
+            return
+        if bloom.count > bloom.capacity:
+            # Too full for the target error rate; rebuild with more room in the
+            # background and keep answering from the current filter meanwhile
+            Thread(target=self.build, name="bloom-rebuild", daemon=True).start()
+        after = None
+        if high_water:
+            after = ObjectId.from_datetime(high_water.generation_time - _CATCH_UP_OVERLAP)
+        try:
+            new_high_water = self._scan(bloom, after)
+        except Exception as e:
+            logger.error(f"Bloom filter catch-up failed: {e}")
+            return
+        with self._lock:
+            if new_high_water and (not self._high_water or new_high_water > self._high_water):
+                self._high_water = new_high_water
+            self._dirty = True
+
+    def save(self):
+        """Persist the filter atomically"""
+        with self._lock:
+            if self._bloom is None or not self._dirty:
+                return
+            bloom = self._bloom
+            header = _HEADER.pack(_MAGIC, bloom.capacity, bloom.num_hashes, bloom.count,
+                                  self._high_water.binary if self._high_water else b'\0' * 12)
+            data = header + bytes(bloom.bits)
+            self._dirty = False
+        try:
+            temp_path = self.path + '.tmp'
+            with open(temp_path, 'wb') as f:
+                f.write(data)
+            os.replace(temp_path, self.path)
+        except OSError as e:
+            logger.error(f"Could not save Bloom filter: {e}")
+
+    def load(self):
+        """Load a persisted filter; returns False if none is usable"""
+        try:
+            with open(self.path, 'rb') as f:
+                data = f.read()
+            magic, capacity, num_hashes, count, high_water = _HEADER.unpack_from(data)
+        except (OSError, struct.error):
+            return False
+        if magic != _MAGIC:
+            return False
+        bits = bytearray(data[_HEADER.size:])
+        bloom = BloomFilter(capacity, self.error_rate, bits, num_hashes, count)
+        with self._lock:
+            self._bloom = bloom
+            self._high_water = ObjectId(high_water) if high_water != b'\0' * 12 else None
+        return True
+
+    def load_or_build(self):
+        """Warm start from disk and catch up, or build from scratch"""
+        try:
+            if self.load():
+                self.catch_up()
+                logger.info(f"✓ Certificate Bloom filter loaded with {self._bloom.count} hashes")
+            else:
+                self.build()
+            self.save()
+        except Exception as e:
+            with self._lock:
+                self._bloom = None
+            logger.error(f"Certificate Bloom filter unavailable, using database lookups: {e}")
+
+    def _refresh_loop(self):
+        """Load or build, then catch up every refresh_seconds off the request path"""
+        self.load_or_build()
+        while True:
+            time.sleep(max(1, self.refresh_seconds - (time.monotonic() - self._last_refresh)))
+            if self.ready:
+                self.catch_up()
+
+    def start(self):
+        """Load or build in the background; lookups fall through to MongoDB until ready"""
+        Thread(target=self._refresh_loop, name="bloom-refresh", daemon=True).start()
+        atexit.register(self.save)
+
+
+certificate_filter = CertificateFilter()
@@ -0,0 +1,59 @@
+"""
+Build Search Index
+Fills the lookup fields used by search for records stored before they
+existed (or for all records with --all):
+  - SearchTokens on certificates (certificate search)
+  - NameKey on students (type-ahead student lookup)
+
+Usage:
+    python build_search_index.py          # only records missing the fields
+    python build_search_index.py --all    # recompute every record
+"""
+
+import sys
+from pymongo import UpdateOne
+from config import certificates_col, students_col
+from models import name_key
+from search import search_tokens
+
+BATCH_SIZE = 1000
+
+
+def backfill(collection, field, fields, compute, rebuild_all, label):
+    """Set field on every matching document in batched bulk writes"""
+    query = {} if rebuild_all else {field: {"$exists": False}}
+
+    updated = 0
+    batch = []
+    for doc in collection.find(query, fields).batch_size(BATCH_SIZE):
+        batch.append(UpdateOne({"_id": doc["_id"]}, {"$set": {field: compute(doc)}}))
+        if len(batch) >= BATCH_SIZE:
+            updated += collection.bulk_write(batch, ordered=False).modified_count
+            batch = []
+            print(f"  ... {updated} {label} indexed")
+    if batch:
+        updated += collection.bulk_write(batch, ordered=False).modified_count
+    print(f"✅ Indexed {updated} {label}")
+
+
+def main():
+    rebuild_all = "--all" in sys.argv[1:]
+
+    print("\n" + "🔍 BUILD SEARCH INDEX ".center(70, "="))
+
+    try:
+        backfill(certificates_col, "SearchTokens",
+                 {"hash": 1, "USN": 1, "Studentname": 1, "Department": 1},
+                 search_tokens, rebuild_all, "certificates")
+        backfill(students_col, "NameKey", {"Name": 1},
+                 lambda doc: name_key(doc.get("Name")), rebuild_all, "students")
+    except Exception as e:
+        print(f"\n❌ Error: {e}")
+        import traceback
+        traceback.print_exc()
+
+    print("=" * 70 + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+"""
+Build Sync Index
+Assigns change sequence numbers (ChangeSeq / UpdatedAt, used by the
+/company/sync delta API) to students and certificates stored before they
+existed or written outside the app (setup scripts).
+
+Usage:
+    python build_sync_index.py
+"""
+
+import datetime
+from pymongo import UpdateOne
+from config import certificates_col, students_col
+from models import reserve_changes
+
+BATCH_SIZE = 1000
+
+
+def backfill(collection, label):
+    """Stamp every record without a ChangeSeq, in _id order"""
+    updated = 0
+    while True:
+        ids = [doc["_id"] for doc in
+               collection.find({"ChangeSeq": {"$exists": False}}, {"_id": 1})
+                         .sort("_id", 1).limit(BATCH_SIZE)]
+        if not ids:
+            break
+        first_seq = reserve_changes(len(ids))
+        now = datetime.datetime.now()
+        batch = [UpdateOne({"_id": _id, "ChangeSeq": {"$exists": False}},
+                           {"$set": {"ChangeSeq": first_seq + i, "UpdatedAt": now}})
+                 for i, _id in enumerate(ids)]
+        updated += collection.bulk_write(batch, ordered=False).modified_count
+        print(f"  ... {updated} {label} stamped")
+    print(f"✅ Stamped {updated} {label}")
+
+
+def main():
+    print("\n" + "🔄 BUILD SYNC INDEX ".center(70, "="))
+
+    try:
+        backfill(students_col, "students")
+        backfill(certificates_col, "certificates")
+    except Exception as e:
+        print(f"\n❌ Error: {e}")
+        import traceback
+        traceback.print_exc()
+
+    print("=" * 70 + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+"""
+In-process caches
+Size-bounded LRU caches with TTL, used for certificate verification.
+Issued certificates never change, so entries only leave the cache when
+they expire, are evicted, or are explicitly invalidated. Registered caches
+log their hit/miss counters every CACHE_STATS_LOG_SECONDS.
+"""
+
+import logging
+import time
+from collections import OrderedDict
+from threading import Lock, Thread
+
+from config import VERIFY_CACHE_SIZE, VERIFY_PAGE_CACHE_SIZE, VERIFY_CACHE_TTL, CACHE_STATS_LOG_SECONDS
+
+logger = logging.getLogger(__name__)
+
+
+class LRUCache:
+    def __init__(self, maxsize, ttl=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, default=None):
+        """Return a cached value and mark it as recently used"""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                value, expires = entry
+                if expires is None or expires > time.monotonic():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+            self.misses += 1
+            return default
+
+    def set(self, key, value):
+        """Store a value, evicting the least recently used entries if full"""
+        expires = time.monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            self._data[key] = (value, expires)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        """Hit/miss counters"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+class VersionedCache:
+    """Read-through LRU cache invalidated by bumping a per-key version.
+
+    A value is only stored if its key's version did not change while it was
+    being loaded, so a slow read that started before an invalidation can
+    never put stale data back into the cache.
+
+    remote_version, if given, returns a version shared by all processes (a
+    counter stored with the data). It is read on every get, before loading,
+    so an invalidation made by another worker takes effect immediately.
+    """
+
+    def __init__(self, loader, maxsize, ttl=None, remote_version=None):
+        self.loader = loader
+        self.remote_version = remote_version
+        self._entries = LRUCache(maxsize, ttl)
+        self._versions = {}
+        self._lock = Lock()
+
+    def get(self, key):
+        with self._lock:
+            version = (self._versions.get(key, 0),
+                       self.remote_version(key) if self.remote_version else None)
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] == version:
+            return entry[1]
+
+        value = self.loader(key)
+        with self._lock:
+            if self._versions.get(key, 0) == version[0]:
+                self._entries.set(key, (version, value))
+        return value
+
+    def invalidate(self, key):
+        with self._lock:
+            self._versions[key] = self._versions.get(key, 0) + 1
+        self._entries.invalidate(key)
+
+    def stats(self):
+        return self._entries.stats()
+
+
+_registry = {}
+_stats_thread = None
+
+
+def register_cache(name, cache):
+    """Include a cache in the periodic stats log; returns the cache"""
+    _registry[name] = cache
+    return cache
+
+
+def log_cache_stats():
+    """Log the counters of every registered cache"""
+    for name, cache in _registry.items():
+        stats = cache.stats()
+        logger.info(f"Cache {name}: {stats['hits']} hits, {stats['misses']} misses "
+                    f"({stats['hit_rate']:.1%} hit rate), {stats['size']}/{stats['maxsize']} entries, "
+                    f"{stats['evictions']} evictions")
+
+
+def start_stats_logger(interval=CACHE_STATS_LOG_SECONDS):
+    """Log cache stats every interval seconds in a daemon thread (0 disables)"""
+    global _stats_thread
+    if interval <= 0 or _stats_thread is not None:
+        return
+
+    def run():
+        while True:
+            time.sleep(interval)
+            log_cache_stats()
+
+    _stats_thread = Thread(target=run, name="cache-stats", daemon=True)
+    _stats_thread.start()
+
+
+# Verification metadata (detail projection) keyed by certificate hash
+certificate_cache = register_cache("certificates", LRUCache(VERIFY_CACHE_SIZE, VERIFY_CACHE_TTL))
+
+# Rendered verify_success.html bytes keyed by certificate hash
+verify_page_cache = register_cache("verify_pages", LRUCache(VERIFY_PAGE_CACHE_SIZE, VERIFY_CACHE_TTL))
+
+
+def invalidate_certificate(cert_hash):
+    """Drop every cached view of a certificate, e.g. when it is revoked or rolled back"""
+    certificate_cache.invalidate(cert_hash)
+    verify_page_cache.invalidate(cert_hash)
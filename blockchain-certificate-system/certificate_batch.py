@@ -0,0 +1,431 @@
+"""
+Bulk Certificate Issuance
+Issues certificates from a CSV file plus a ZIP archive of PDFs. CSV columns:
+    USN, AcademicYear, JoiningDate, EndDate, CGPA, Personality, Skills, File
+File is the PDF's path inside the ZIP and Skills may be empty. Name and
+department come from the student record, which must belong to the college.
+
+Rows are processed in small chunks: student records are fetched with one
+$in query per chunk, PDFs are read from the archive one at a time, and the
+certificate and file hashes are computed on a shared thread pool (hashlib
+releases the GIL).
+Certificates are anchored with one block per CERTIFICATE_BATCH_BLOCK_SIZE
+certificates. A batch block holds a manifest (hash, USN, CollegeID,
+FileSHA256) instead of the full certificate data, so proof-of-work and
+chain writes do not grow with the PDFs. Certificates are stored as Pending
+and cannot be looked up or verified until their block is written. If a
+block fails, or the run stops with certificates stored but not yet
+anchored, those certificates are removed again.
+
+Usage:
+    python certificate_batch.py ABC001 certificates.csv certificates.zip
+    python certificate_batch.py ABC001 certificates.csv certificates.zip --report report.csv
+"""
+
+import argparse
+import base64
+import csv
+import datetime
+import hashlib
+import io
+import logging
+import os
+import re
+import sys
+import uuid
+import zipfile
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from threading import Lock, Thread
+
+from blockchain import BlockChain
+from config import students_col, CERTIFICATE_BATCH_BLOCK_SIZE, CERTIFICATE_BATCH_HASH_WORKERS
+from models import AccessLog
+
+logger = logging.getLogger(__name__)
+
+BATCH_COLUMNS = ["USN", "AcademicYear", "JoiningDate", "EndDate", "CGPA",
+                 "Personality", "Skills", "File"]
+OPTIONAL_COLUMNS = ["Skills"]
+
+# Rows whose PDFs are held in memory at once
+READ_CHUNK_SIZE = 16
+MAX_PDF_SIZE = 10 * 1024 * 1024  # 10MB, same as single issuance
+
+# Finished jobs kept for progress and report lookups
+MAX_JOBS = 100
+
+REPORT_FIELDS = ["row", "USN", "status", "hash", "error"]
+
+_USN = re.compile(r"^[0-9A-Z]+$")
+
+_hash_pool = ThreadPoolExecutor(max_workers=CERTIFICATE_BATCH_HASH_WORKERS,
+                                thread_name_prefix="certificate-hash")
+
+
+class BatchFormatError(Exception):
+    """The upload is not a usable certificate CSV / ZIP pair"""
+    pass
+
+
+def _validate(row):
+    """Normalized certificate fields, or an error message"""
+    fields = {column: (row.get(column) or "").strip() for column in BATCH_COLUMNS}
+    fields["USN"] = fields["USN"].upper()
+
+    missing = [column for column in BATCH_COLUMNS
+               if column not in OPTIONAL_COLUMNS and not fields[column]]
+    if missing:
+        return None, f"Missing {', '.join(missing)}"
+    if not _USN.match(fields["USN"]):
+        return None, "USN may only contain letters and digits"
+    try:
+        cgpa = float(fields["CGPA"])
+    except ValueError:
+        return None, "Invalid CGPA value"
+    if cgpa < 0 or cgpa > 10:
+        return None, "CGPA must be between 0 and 10"
+    return fields, None
+
+
+def _read_rows(stream):
+    """Yield (line number, row) from a CSV text stream"""
+    reader = csv.DictReader(stream)
+    header = [name.strip() for name in (reader.fieldnames or [])]
+    missing = [column for column in BATCH_COLUMNS
+               if column not in header and column not in OPTIONAL_COLUMNS]
+    if missing:
+        raise BatchFormatError(f"CSV is missing columns: {', '.join(missing)}")
+    reader.fieldnames = header
+    for row in reader:
+        # Header is line 1
+        yield reader.line_num, row
+
+
+def _read_pdf(archive, name):
+    """PDF bytes of an archive member, or an error message"""
+    try:
+        info = archive.getinfo(name)
+    except KeyError:
+        return None, f"{name} not found in ZIP"
+    if info.file_size > MAX_PDF_SIZE:
+        return None, f"File too large. Maximum size is {MAX_PDF_SIZE // (1024*1024)}MB"
+    if info.file_size == 0:
+        return None, "File is empty"
+    with archive.open(info) as f:
+        content = f.read()
+    if not content.startswith(b'%PDF'):
+        return None, "Not a valid PDF file"
+    return content, None
+
+
+def _certificate_data(fields, student, college_id, content):
+    """Certificate data without its hash.
+
+    Builds the same data dict, in the same key order, as
+    BlockChain.addCertificate so both paths hash certificates identically.
+    """
+    return {
+        "USN": fields["USN"],
+        "Studentname": student["Name"],
+        "Department": student["Department"],
+        "CollegeID": college_id,
+        "AcademicYear": fields["AcademicYear"],
+        "JoiningDate": fields["JoiningDate"],
+        "EndDate": fields["EndDate"],
+        "CGPA": fields["CGPA"],
+        "CertificateFile": base64.b64encode(content).decode(),
+        "Personality": fields["Personality"],
+        "Skills": fields["Skills"],
+        "CreatedAt": str(datetime.datetime.now())
+    }
+
+
+def _hash_certificate(data, content):
+    """Certificate hash and file digest (runs on the hashing pool)"""
+    return hashlib.sha256(str(data).encode()).hexdigest(), hashlib.sha256(content).hexdigest()
+
+
+def issue_certificates(csv_stream, archive, college_id, batch_id=None,
+                       block_size=None, workers=None, progress=None):
+    """Issue certificates for every valid CSV row.
+
+    archive is an open zipfile.ZipFile. progress, if given, is called with
+    each report entry as its outcome becomes known. workers hashes on a pool
+    of that many threads instead of the shared one. Returns (summary, report).
+    Raises BatchFormatError if the CSV header is unusable.
+    """
+    college_id = college_id.upper()
+    batch_id = batch_id or uuid.uuid4().hex
+    block_size = block_size or CERTIFICATE_BATCH_BLOCK_SIZE
+    bc = BlockChain()
+    report = []
+    pending = []  # (report entry, manifest entry) stored but not yet anchored
+    blocks = [0]
+
+    def record(entry):
+        report.append(entry)
+        if progress:
+            progress(entry)
+
+    def fail(line, usn, error):
+        record({"row": line, "USN": usn, "status": "error", "hash": "", "error": error})
+
+    def anchor(count=None):
+        batch = pending[:count]
+        if not batch:
+            return
+        entries = [manifest for _, manifest in batch]
+        anchored = bc.anchorCertificateBatch(batch_id, college_id, entries)
+        if anchored:
+            blocks[0] += 1
+        for entry, _ in batch:
+            if anchored:
+                entry["status"] = "issued"
+            else:
+                entry.update(status="error", hash="", error="Blockchain anchoring failed")
+            record(entry)
+        del pending[:len(batch)]
+
+    def process(chunk, pool):
+        if not chunk:
+            return
+        usns = list({fields["USN"] for _, fields in chunk})
+        students = {
+            student["USN"]: student
+            for student in students_col.find({"CollegeID": college_id, "USN": {"$in": usns}},
+                                             {"_id": 0, "USN": 1, "Name": 1, "Department": 1})
+        }
+
+        items = []
+        for line, fields in chunk:
+            student = students.get(fields["USN"])
+            if not student:
+                fail(line, fields["USN"], "Student not found in your college")
+                continue
+            content, error = _read_pdf(archive, fields["File"])
+            if error:
+                fail(line, fields["USN"], error)
+                continue
+            items.append((line, _certificate_data(fields, student, college_id, content), content))
+        if not items:
+            return
+
+        digests = list(pool.map(_hash_certificate, [data for _, data, _ in items],
+                                [content for _, _, content in items]))
+        prepared = []
+        for (line, data, _), (cert_hash, file_digest) in zip(items, digests):
+            data["hash"] = cert_hash
+            prepared.append((line, data, file_digest))
+
+        failed = bc.storeCertificateBatch([data for _, data, _ in prepared], batch_id)
+        for index, (line, data, file_digest) in enumerate(prepared):
+            if index in failed:
+                fail(line, data["USN"], failed[index])
+                continue
+            entry = {"row": line, "USN": data["USN"], "status": "stored",
+                     "hash": data["hash"], "error": ""}
+            pending.append((entry, {"hash": data["hash"], "USN": data["USN"],
+                                    "Studentname": data["Studentname"],
+                                    "Department": data["Department"],
+                                    "FileSHA256": file_digest}))
+        # Queue every stored certificate first, so all of them are discarded if anchoring raises
+        while len(pending) >= block_size:
+            anchor(block_size)
+
+    rows = _read_rows(csv_stream)
+    own_pool = ThreadPoolExecutor(max_workers=workers) if workers else None
+    try:
+        with own_pool or nullcontext(_hash_pool) as pool:
+            chunk = []
+            for line, row in rows:
+                fields, error = _validate(row)
+                if error:
+                    fail(line, (row.get("USN") or "").strip().upper(), error)
+                    continue
+                chunk.append((line, fields))
+                if len(chunk) >= READ_CHUNK_SIZE:
+                    process(chunk, pool)
+                    chunk = []
+            process(chunk, pool)
+            anchor()
+    finally:
+        if pending:
+            # Stopped by an error with certificates stored but not on the chain;
+            # remove them so they cannot verify as genuine
+            try:
+                bc.discardCertificateBatch(college_id, [manifest for _, manifest in pending])
+            except Exception as e:
+                logger.error(f"✗ Could not remove unanchored certificates of batch {batch_id}: {e}")
+            for entry, _ in pending:
+                entry.update(status="error", hash="", error="Batch stopped before anchoring")
+                record(entry)
+            pending.clear()
+
+    report.sort(key=lambda entry: entry["row"])
+    summary = {
+        "batch_id": batch_id,
+        "rows": len(report),
+        "issued": sum(1 for entry in report if entry["status"] == "issued"),
+        "errors": sum(1 for entry in report if entry["status"] == "error"),
+        "blocks": blocks[0],
+    }
+    return summary, report
+
+
+def report_csv(report):
+    """Per-row report as CSV text"""
+    output = io.StringIO()
+    writer = csv.DictWriter(output, fieldnames=REPORT_FIELDS)
+    writer.writeheader()
+    writer.writerows(report)
+    return output.getvalue()
+
+
+def count_rows(csv_path):
+    """Data rows in a CSV file (for progress totals)"""
+    with open(csv_path, "r", newline="", encoding="utf-8-sig") as f:
+        return max(0, sum(1 for row in csv.reader(f) if row) - 1)
+
+
+class BatchJob:
+    """Progress of one background issuance"""
+
+    def __init__(self, college_id, total):
+        self.id = uuid.uuid4().hex
+        self.college_id = college_id.upper()
+        self.total = total
+        self.processed = 0
+        self.issued = 0
+        self.errors = 0
+        self.status = "queued"
+        self.message = ""
+        self.summary = None
+        self.report = []
+        self.created_at = datetime.datetime.now()
+        self.finished_at = None
+        self._lock = Lock()
+
+    def progress(self, entry):
+        with self._lock:
+            # Kept as rows finish, so a failed batch still has a partial report
+            self.report.append(entry)
+            self.processed += 1
+            if entry["status"] == "issued":
+                self.issued += 1
+            else:
+                self.errors += 1
+
+    def sorted_report(self):
+        with self._lock:
+            return sorted(self.report, key=lambda entry: entry["row"])
+
+    def to_dict(self):
+        with self._lock:
+            return {
+                "id": self.id,
+                "status": self.status,
+                "message": self.message,
+                "total": self.total,
+                "processed": self.processed,
+                "issued": self.issued,
+                "errors": self.errors,
+                "blocks": self.summary["blocks"] if self.summary else 0,
+                "finished": self.status in ("done", "failed"),
+            }
+
+
+_jobs = OrderedDict()
+_jobs_lock = Lock()
+
+
+def _run_job(job, csv_path, zip_path):
+    job.status = "running"
+    try:
+        with open(csv_path, "r", newline="", encoding="utf-8-sig") as csv_stream, \
+                zipfile.ZipFile(zip_path) as archive:
+            summary, _ = issue_certificates(csv_stream, archive, job.college_id,
+                                            batch_id=job.id, progress=job.progress)
+        with job._lock:
+            job.summary = summary
+            job.status = "done"
+        AccessLog.log("College", job.college_id,
+                      f"Issued certificate batch {job.id} ({summary['issued']} issued)")
+    except (BatchFormatError, UnicodeDecodeError, zipfile.BadZipFile) as e:
+        job.status, job.message = "failed", f"Could not read upload: {e}"
+    except Exception as e:
+        logger.exception(f"Certificate batch {job.id} failed")
+        job.status, job.message = "failed", "Batch failed; see the server log"
+        if job.issued:
+            AccessLog.log("College", job.college_id,
+                          f"Issued certificate batch {job.id} ({job.issued} issued, batch failed)")
+    finally:
+        job.finished_at = datetime.datetime.now()
+        for path in (csv_path, zip_path):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+def start_job(college_id, csv_path, zip_path):
+    """Issue a batch in a background thread; the uploaded files are deleted afterwards"""
+    job = BatchJob(college_id, count_rows(csv_path))
+    with _jobs_lock:
+        _jobs[job.id] = job
+        while len(_jobs) > MAX_JOBS:
+            oldest = next(iter(_jobs.values()))
+            if not oldest.finished_at:
+                break
+            _jobs.popitem(last=False)
+    Thread(target=_run_job, args=(job, csv_path, zip_path),
+           name=f"certificate-batch-{job.id[:8]}", daemon=True).start()
+    return job
+
+
+def get_job(job_id, college_id):
+    """A college's batch job, or None"""
+    with _jobs_lock:
+        job = _jobs.get(job_id)
+    if job and job.college_id == college_id.upper():
+        return job
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk issue certificates from a CSV file and a ZIP of PDFs")
+    parser.add_argument("college_id")
+    parser.add_argument("csv_file")
+    parser.add_argument("zip_file")
+    parser.add_argument("--report", help="Write the per-row report to this CSV file")
+    parser.add_argument("--workers", type=int, default=None, help="Hashing threads")
+    args = parser.parse_args()
+
+    print("\n" + "📜 BULK CERTIFICATE ISSUANCE ".center(70, "="))
+    try:
+        with open(args.csv_file, "r", newline="", encoding="utf-8-sig") as csv_stream, \
+                zipfile.ZipFile(args.zip_file) as archive:
+            summary, report = issue_certificates(csv_stream, archive, args.college_id,
+                                                 workers=args.workers)
+    except (OSError, BatchFormatError, zipfile.BadZipFile) as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+
+    for entry in report:
+        if entry["status"] == "error":
+            print(f"  ❌ Row {entry['row']} {entry['USN']}: {entry['error']}")
+    print(f"✅ Issued {summary['issued']} of {summary['rows']} certificates "
+          f"in {summary['blocks']} blocks ({summary['errors']} errors)")
+    print(f"   Batch ID: {summary['batch_id']}")
+
+    if args.report:
+        with open(args.report, "w", newline="") as f:
+            f.write(report_csv(report))
+        print(f"✓ Report written to {args.report}")
+    print("=" * 70 + "\n")
+    sys.exit(1 if summary["errors"] else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,343 @@
+"""
+Chain Store
+File-level helpers for the NODES/N* blockchain replicas.
+This module has no MongoDB dependency so offline tools can import it.
+"""
+
+import ast
+import hashlib
+import json
+import logging
+import os
+import time
+from contextlib import contextmanager
+from threading import Lock
+
+try:
+    import fcntl
+except ImportError:
+    # Windows: only the in-process lock in BlockChain serializes appends
+    fcntl = None
+
+NODES_DIR = './NODES'
+NODE_NAMES = ['N1', 'N2', 'N3', 'N4']
+
+# How long a failed node is skipped before it is tried again
+NODE_RETRY_SECONDS = 30
+
+logger = logging.getLogger(__name__)
+
+_WHITESPACE = ' \t\r\n'
+
+
+def node_path(node):
+    """Path of a node's blockchain file"""
+    return os.path.join(NODES_DIR, node, 'blockchain.json')
+
+
+@contextmanager
+def chain_lock():
+    """Exclusive lock on the node files, shared by every process that appends blocks
+    (the app and reconcile.py --repair)"""
+    if fcntl is None:
+        yield
+        return
+    os.makedirs(NODES_DIR, exist_ok=True)
+    with open(os.path.join(NODES_DIR, '.chain.lock'), 'a') as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def block_hash(block):
+    """Hash of a block, as stored in the next block's previous_hash"""
+    return hashlib.sha256(json.dumps(block, sort_keys=True).encode()).hexdigest()
+
+
+def block_payload(block):
+    """Certificate data stored in a block, or None for non-certificate blocks"""
+    data = block.get('data')
+    if not isinstance(data, str):
+        return None
+    try:
+        payload = ast.literal_eval(data)
+    except (ValueError, SyntaxError):
+        return None
+    return payload if isinstance(payload, dict) else None
+
+
+# Block data of a batch issuance: a manifest of certificates instead of one
+# certificate's full data. The certificates themselves live in MongoDB.
+BATCH_BLOCK_TYPE = 'CertificateBatch'
+
+
+def is_batch_payload(payload):
+    return bool(payload) and payload.get('Type') == BATCH_BLOCK_TYPE
+
+
+def block_certificates(block, payload=None):
+    """Certificates anchored by a block.
+
+    A single-certificate block yields its full payload. A batch block yields
+    its manifest entries (hash, USN, CollegeID, FileSHA256).
+    """
+    if payload is None:
+        payload = block_payload(block)
+    if is_batch_payload(payload):
+        return [entry for entry in payload.get('Certificates', []) if entry.get('hash')]
+    if payload and payload.get('hash'):
+        return [payload]
+    return []
+
+
+def block_certificate_hashes(block):
+    """Hashes of the certificates anchored by a block"""
+    return [entry['hash'] for entry in block_certificates(block)]
+
+
+# Fields that exist only on MongoDB certificate documents, never in block data
+MONGO_ONLY_FIELDS = ('_id', 'SearchTokens', 'BatchID', 'ChangeSeq', 'UpdatedAt')
+
+
+def chain_payload(doc):
+    """Certificate data as stored on the chain, without MongoDB-only fields"""
+    return {k: v for k, v in doc.items() if k not in MONGO_ONLY_FIELDS}
+
+
+def certificate_digest(payload):
+    """Recompute a certificate hash from its payload (without the hash field)"""
+    data = {k: v for k, v in chain_payload(payload).items() if k != 'hash'}
+    return hashlib.sha256(str(data).encode()).hexdigest()
+
+
+def iter_blocks(node='N1', offset=0, chunk_size=64 * 1024):
+    """Stream blocks from a node file without loading the whole chain.
+
+    Yields (block, start, end) where start/end are character offsets of the
+    block inside the file. Passing a previous ``end`` as ``offset`` resumes
+    right after that block. Chain files are written by json.dump with
+    ensure_ascii, so character offsets equal byte offsets.
+    """
+    path = node_path(node)
+    if not os.path.exists(path):
+        return
+
+    decoder = json.JSONDecoder()
+
+    with open(path, 'r', encoding='utf-8', newline='') as f:
+        f.seek(offset)
+        state = {'buf': '', 'pos': 0, 'base': offset, 'eof': False}
+
+        def fill(min_size=0):
+            if state['eof']:
+                return False
+            more = f.read(max(chunk_size, min_size))
+            if not more:
+                state['eof'] = True
+                return False
+            state['base'] += state['pos']
+            state['buf'] = state['buf'][state['pos']:] + more
+            state['pos'] = 0
+            return True
+
+        def skip(chars):
+            while True:
+                buf, pos = state['buf'], state['pos']
+                while pos < len(buf) and buf[pos] in chars:
+                    pos += 1
+                state['pos'] = pos
+                if pos < len(buf) or not fill():
+                    return pos < len(state['buf'])
+
+        if offset == 0:
+            if not skip(_WHITESPACE):
+                return
+            if state['buf'][state['pos']] != '[':
+                raise ValueError(f"Blockchain file for {node} is not a JSON array")
+            state['pos'] += 1
+
+        while True:
+            if not skip(_WHITESPACE + ','):
+                raise ValueError(f"Unterminated blockchain file for {node}")
+            if state['buf'][state['pos']] == ']':
+                return
+
+            while True:
+                try:
+                    block, end = decoder.raw_decode(state['buf'], state['pos'])
+                    break
+                except json.JSONDecodeError:
+                    # Block spans past the buffer; grow it geometrically
+                    if not fill(len(state['buf']) - state['pos']):
+                        raise
+
+            start = state['base'] + state['pos']
+            state['pos'] = end
+            yield block, start, state['base'] + end
+
+
+def read_block_at(node, offset):
+    """Read a single block starting at a known file offset"""
+    with open(node_path(node), 'r', encoding='utf-8', newline='') as f:
+        f.seek(offset)
+        decoder = json.JSONDecoder()
+        buf = ''
+        while True:
+            more = f.read(64 * 1024 + len(buf))
+            if not more:
+                raise ValueError(f"No block at offset {offset} in {node}")
+            buf += more
+            try:
+                block, _ = decoder.raw_decode(buf)
+                return block
+            except json.JSONDecodeError:
+                continue
+
+
+class ChainUnavailable(Exception):
+    """No node holds a readable copy of the chain"""
+    pass
+
+
+def read_node(node):
+    """Read and parse a node file, raising on missing, empty or corrupt files"""
+    with open(node_path(node), 'r') as f:
+        content = f.read().strip()
+    if not content:
+        raise ValueError(f"Blockchain file for {node} is empty")
+    chain = json.loads(content)
+    if not isinstance(chain, list):
+        raise ValueError(f"Blockchain file for {node} is not a JSON array")
+    return chain
+
+
+class NodeSelector:
+    """Spreads chain reads across healthy nodes and fails over between them.
+
+    Nodes are grouped by file size, which is a cheap stat() and identical for
+    replicas written by write_chain. Reads go round-robin over the largest
+    (majority) group; a node that fails is marked unhealthy and skipped for
+    NODE_RETRY_SECONDS while the next majority node is tried immediately.
+    read() only ever returns a copy held by a quorum (more than half of all
+    nodes), since the caller rewrites every node from it.
+    """
+
+    def __init__(self, nodes=None, retry_after=NODE_RETRY_SECONDS):
+        self.nodes = list(nodes or NODE_NAMES)
+        self.retry_after = retry_after
+        self._lock = Lock()
+        self._turn = 0
+        self._health = {
+            node: {
+                'healthy': True,
+                'failures': 0,
+                'reads': 0,
+                'last_error': None,
+                'last_failure': None,
+            }
+            for node in self.nodes
+        }
+
+    def health(self):
+        """Snapshot of per-node health state"""
+        with self._lock:
+            return {node: dict(state) for node, state in self._health.items()}
+
+    def mark_ok(self, node):
+        with self._lock:
+            state = self._health[node]
+            state['healthy'] = True
+            state['reads'] += 1
+
+    def mark_failed(self, node, error):
+        with self._lock:
+            state = self._health[node]
+            state['healthy'] = False
+            state['failures'] += 1
+            state['last_error'] = str(error)
+            state['last_failure'] = time.time()
+        logger.error(f"Node {node} unreadable: {error}")
+
+    def _available(self, node, now):
+        state = self._health[node]
+        if state['healthy']:
+            return True
+        return now - state['last_failure'] >= self.retry_after
+
+    def _groups(self):
+        """Non-empty nodes grouped by file size, majority group first"""
+        groups = {}
+        missing = []
+        for node in self.nodes:
+            try:
+                size = os.stat(node_path(node)).st_size
+            except OSError:
+                size = 0
+            if size:
+                groups.setdefault(size, []).append(node)
+            else:
+                missing.append(node)
+        # On a tie prefer the longer chain
+        ordered = sorted(groups.items(), key=lambda item: (len(item[1]), item[0]), reverse=True)
+        return [members for _, members in ordered], missing
+
+    def majority(self):
+        """Nodes whose files agree with the largest group"""
+        ordered, _ = self._groups()
+        return ordered[0] if ordered else []
+
+    def candidates(self):
+        """Nodes in the order they should be tried"""
+        ordered, missing = self._groups()
+
+        with self._lock:
+            now = time.time()
+            self._turn = (self._turn + 1) % len(self.nodes)
+            turn = self._turn
+
+            preferred, fallback = [], []
+            for members in ordered:
+                members = members[turn % len(members):] + members[:turn % len(members)]
+                for node in members:
+                    if self._available(node, now):
+                        preferred.append(node)
+                    else:
+                        fallback.append(node)
+
+        return preferred + fallback + missing
+
+    def read(self):
+        """Return (node, chain) from the first readable node of the quorum group.
+
+        Raises ChainUnavailable instead of falling back to a minority or stale
+        copy, which write_chain would otherwise copy over every node.
+        """
+        ordered, _ = self._groups()
+        if not ordered:
+            if any(os.path.exists(node_path(node)) for node in self.nodes):
+                raise ChainUnavailable("All blockchain node files are empty")
+            # No node files at all: a fresh chain
+            return None, []
+
+        quorum = len(self.nodes) // 2 + 1
+        majority = ordered[0]
+        if len(majority) < quorum:
+            raise ChainUnavailable(f"No quorum: at most {len(majority)} of {len(self.nodes)} "
+                                   f"blockchain nodes agree (need {quorum})")
+
+        tried = 0
+        for node in self.candidates():
+            if node not in majority:
+                continue
+            tried += 1
+            try:
+                chain = read_node(node)
+            except (OSError, ValueError) as e:
+                self.mark_failed(node, e)
+                continue
+            self.mark_ok(node)
+            return node, chain
+
+        raise ChainUnavailable(f"All {tried} quorum blockchain nodes are unreadable")
@@ -16,6 +16,89 @@ STUDENTS_COLLECTION = "students"
 COLLEGES_COLLECTION = "colleges"
 COMPANIES_COLLECTION = "companies"
 ACCESS_LOGS_COLLECTION = "access_logs"
+STATS_COLLECTION = "stats"
+ACCESS_LOG_BUCKETS_COLLECTION = "access_log_buckets"
+ACCESS_ROLLUPS_COLLECTION = "access_rollups"
+ROLLUP_STATE_COLLECTION = "rollup_state"
+CERTIFICATE_SCANS_COLLECTION = "certificate_scans"
+COUNTERS_COLLECTION = "counters"
+DELETIONS_COLLECTION = "deletions"
+
+# Verification cache configuration
+VERIFY_CACHE_SIZE = int(os.getenv("VERIFY_CACHE_SIZE", "10000"))
+VERIFY_PAGE_CACHE_SIZE = int(os.getenv("VERIFY_PAGE_CACHE_SIZE", "2000"))
+VERIFY_CACHE_TTL = int(os.getenv("VERIFY_CACHE_TTL", "3600"))  # seconds
+CACHE_STATS_LOG_SECONDS = int(os.getenv("CACHE_STATS_LOG_SECONDS", "300"))  # 0 disables the stats log
+
+# Company -> college permission cache. Grants and revocations bump the
+# company's AccessVersion, which every lookup checks, so they apply to all
+# workers immediately; the TTL bounds staleness of other profile fields.
+ACCESS_CACHE_SIZE = int(os.getenv("ACCESS_CACHE_SIZE", "10000"))
+ACCESS_CACHE_TTL = int(os.getenv("ACCESS_CACHE_TTL", "10"))  # seconds
+
+# Buffered access log writer; overflow is one of sync, block, drop_newest, drop_oldest
+ACCESS_LOG_BATCH_SIZE = int(os.getenv("ACCESS_LOG_BATCH_SIZE", "100"))
+ACCESS_LOG_FLUSH_SECONDS = float(os.getenv("ACCESS_LOG_FLUSH_SECONDS", "1.0"))
+ACCESS_LOG_QUEUE_SIZE = int(os.getenv("ACCESS_LOG_QUEUE_SIZE", "10000"))
+ACCESS_LOG_OVERFLOW = os.getenv("ACCESS_LOG_OVERFLOW", "sync")
+
+# Access log storage: "documents" (one per entry) or "buckets" (per user per hour)
+ACCESS_LOG_STORAGE = os.getenv("ACCESS_LOG_STORAGE", "documents")
+ACCESS_LOG_BUCKET_SIZE = int(os.getenv("ACCESS_LOG_BUCKET_SIZE", "1000"))  # entries per bucket
+# Days access logs are kept. Off (0, keep forever) unless set: enabling it creates a
+# TTL index that immediately deletes every existing entry older than the limit.
+ACCESS_LOG_RETENTION_DAYS = int(os.getenv("ACCESS_LOG_RETENTION_DAYS", "0"))
+
+# Access log rollups only fold entries older than this, so buffered writes can land first
+ROLLUP_LAG_SECONDS = int(os.getenv("ROLLUP_LAG_SECONDS", "300"))
+
+# Bloom filter of issued certificate hashes
+BLOOM_FILE = os.getenv("BLOOM_FILE", "certificate_hashes.bloom")
+BLOOM_CAPACITY = int(os.getenv("BLOOM_CAPACITY", "1000000"))
+BLOOM_ERROR_RATE = float(os.getenv("BLOOM_ERROR_RATE", "0.001"))
+BLOOM_REFRESH_SECONDS = int(os.getenv("BLOOM_REFRESH_SECONDS", "5"))
+
+# Verification scan counters are flushed in bulk this often (seconds)
+SCAN_FLUSH_SECONDS = float(os.getenv("SCAN_FLUSH_SECONDS", "5"))
+SCAN_MAX_PENDING = int(os.getenv("SCAN_MAX_PENDING", "100000"))  # distinct hashes before an early flush
+
+# HTTP caching of verification pages and certificate downloads (seconds)
+VERIFY_MAX_AGE = int(os.getenv("VERIFY_MAX_AGE", "300"))
+DOWNLOAD_MAX_AGE = int(os.getenv("DOWNLOAD_MAX_AGE", "86400"))
+
+# Bulk certificate issuance: certificates anchored per block, and the upload limit
+# for the CSV + ZIP request (other requests keep MAX_CONTENT_LENGTH)
+CERTIFICATE_BATCH_BLOCK_SIZE = int(os.getenv("CERTIFICATE_BATCH_BLOCK_SIZE", "500"))
+CERTIFICATE_BATCH_MAX_UPLOAD = int(os.getenv("CERTIFICATE_BATCH_MAX_UPLOAD", str(500 * 1024 * 1024)))
+CERTIFICATE_BATCH_HASH_WORKERS = int(os.getenv("CERTIFICATE_BATCH_HASH_WORKERS", str(os.cpu_count() or 2)))
+
+# Batch verification: identifiers accepted per request, and identifiers per $in query
+BATCH_VERIFY_MAX_IDENTIFIERS = int(os.getenv("BATCH_VERIFY_MAX_IDENTIFIERS", "10000"))
+BATCH_VERIFY_CHUNK_SIZE = int(os.getenv("BATCH_VERIFY_CHUNK_SIZE", "500"))
+
+# Password checks: bcrypt cost for new and upgraded hashes, worker threads
+# (bcrypt releases the GIL), checks allowed to queue before logins are turned
+# away, and the longest a request waits for its check (seconds)
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+AUTH_WORKERS = int(os.getenv("AUTH_WORKERS", str(os.cpu_count() or 2)))
+AUTH_QUEUE_LIMIT = int(os.getenv("AUTH_QUEUE_LIMIT", str(AUTH_WORKERS * 4)))
+AUTH_TIMEOUT = float(os.getenv("AUTH_TIMEOUT", "10"))
+
+# Failed attempts allowed per account within LOGIN_LOCKOUT_SECONDS before it is
+# locked for LOGIN_LOCKOUT_SECONDS
+LOGIN_MAX_FAILURES = int(os.getenv("LOGIN_MAX_FAILURES", "5"))
+LOGIN_LOCKOUT_SECONDS = int(os.getenv("LOGIN_LOCKOUT_SECONDS", "300"))
+
+# Threads hashing passwords for bulk student imports, shared by all imports
+IMPORT_HASH_WORKERS = int(os.getenv("IMPORT_HASH_WORKERS", str(os.cpu_count() or 2)))
+
+# Documents fetched per page by streaming exports
+EXPORT_PAGE_SIZE = int(os.getenv("EXPORT_PAGE_SIZE", "1000"))
+
+# Delta sync: changes per response, and how old a change must be before it is
+# handed out (covers stamps that took a sequence number but have not landed yet)
+SYNC_PAGE_SIZE = int(os.getenv("SYNC_PAGE_SIZE", "500"))
+SYNC_SETTLE_SECONDS = float(os.getenv("SYNC_SETTLE_SECONDS", "5"))
 
 # Create MongoDB client
 client = MongoClient(MONGO_URI, serverSelectionTimeoutMS=5000)
@@ -29,6 +112,26 @@ students_col = mydb[STUDENTS_COLLECTION]
 colleges_col = mydb[COLLEGES_COLLECTION]
 companies_col = mydb[COMPANIES_COLLECTION]
 access_logs_col = mydb[ACCESS_LOGS_COLLECTION]
+stats_col = mydb[STATS_COLLECTION]
+access_log_buckets_col = mydb[ACCESS_LOG_BUCKETS_COLLECTION]
+access_rollups_col = mydb[ACCESS_ROLLUPS_COLLECTION]
+rollup_state_col = mydb[ROLLUP_STATE_COLLECTION]
+certificate_scans_col = mydb[CERTIFICATE_SCANS_COLLECTION]
+counters_col = mydb[COUNTERS_COLLECTION]
+deletions_col = mydb[DELETIONS_COLLECTION]
+
+def ensure_ttl_index(collection, field, seconds):
+    """Create, retune (collMod) or drop the TTL index on field"""
+    name = f"{field}_1"
+    existing = collection.index_information().get(name)
+    if seconds > 0:
+        if not existing:
+            collection.create_index(field, expireAfterSeconds=seconds)
+        elif existing.get("expireAfterSeconds") != seconds:
+            mydb.command("collMod", collection.name,
+                         index={"keyPattern": {field: 1}, "expireAfterSeconds": seconds})
+    elif existing and "expireAfterSeconds" in existing:
+        collection.drop_index(name)
 
 # Test connection and create indexes
 try:
@@ -40,6 +143,11 @@ try:
     student_indexes = students_col.index_information()
     college_indexes = colleges_col.index_information()
     company_indexes = companies_col.index_information()
+    stats_indexes = stats_col.index_information()
+    log_indexes = access_logs_col.index_information()
+    bucket_indexes = access_log_buckets_col.index_information()
+    rollup_indexes = access_rollups_col.index_information()
+    deletion_indexes = deletions_col.index_information()
     
     # Certificate indexes
     if 'hash_1' not in cert_indexes:
@@ -51,6 +159,26 @@ try:
     if 'CollegeID_1' not in cert_indexes:
         certificates_col.create_index("CollegeID")
     
+    # Keyset pagination indexes (newest first, _id as tie-breaker)
+    if 'CollegeID_1_CreatedAt_-1__id_-1' not in cert_indexes:
+        certificates_col.create_index([("CollegeID", 1), ("CreatedAt", -1), ("_id", -1)])
+    if 'CollegeID_1_Department_1_CreatedAt_-1__id_-1' not in cert_indexes:
+        certificates_col.create_index([("CollegeID", 1), ("Department", 1), ("CreatedAt", -1), ("_id", -1)])
+    if 'USN_1_CreatedAt_-1__id_-1' not in cert_indexes:
+        certificates_col.create_index([("USN", 1), ("CreatedAt", -1), ("_id", -1)])
+    
+    # Search token index (multikey); backfill with build_search_index.py
+    if 'SearchTokens_1_CollegeID_1' not in cert_indexes:
+        certificates_col.create_index([("SearchTokens", 1), ("CollegeID", 1)])
+    
+    # Delta sync (changes per college in sequence order); backfill with build_sync_index.py
+    if 'CollegeID_1_ChangeSeq_1' not in cert_indexes:
+        certificates_col.create_index([("CollegeID", 1), ("ChangeSeq", 1)])
+    
+    # Delta sync tombstones for deleted students and certificates
+    if 'CollegeID_1_ChangeSeq_1' not in deletion_indexes:
+        deletions_col.create_index([("CollegeID", 1), ("ChangeSeq", 1)])
+    
     # Student indexes
     if 'USN_1' not in student_indexes:
         students_col.create_index("USN", unique=True)
@@ -59,6 +187,22 @@ try:
     if 'CollegeID_1' not in student_indexes:
         students_col.create_index("CollegeID")
     
+    # Type-ahead lookup indexes (prefix matches on USN and normalized name)
+    if 'CollegeID_1_USN_1' not in student_indexes:
+        students_col.create_index([("CollegeID", 1), ("USN", 1)])
+    if 'CollegeID_1_NameKey_1' not in student_indexes:
+        students_col.create_index([("CollegeID", 1), ("NameKey", 1)])
+    
+    # Keyset pagination indexes (by name, _id as tie-breaker)
+    if 'CollegeID_1_Name_1__id_1' not in student_indexes:
+        students_col.create_index([("CollegeID", 1), ("Name", 1), ("_id", 1)])
+    if 'CollegeID_1_Department_1_Name_1__id_1' not in student_indexes:
+        students_col.create_index([("CollegeID", 1), ("Department", 1), ("Name", 1), ("_id", 1)])
+    
+    # Delta sync
+    if 'CollegeID_1_ChangeSeq_1' not in student_indexes:
+        students_col.create_index([("CollegeID", 1), ("ChangeSeq", 1)])
+    
     # College indexes
     if 'CollegeID_1' not in college_indexes:
         colleges_col.create_index("CollegeID", unique=True)
@@ -67,6 +211,42 @@ try:
     if 'CompanyID_1' not in company_indexes:
         companies_col.create_index("CompanyID", unique=True)
     
+    # Grantee lookup (multikey) and company picker pagination
+    if 'AccessibleColleges_1_Name_1' not in company_indexes:
+        companies_col.create_index([("AccessibleColleges", 1), ("Name", 1)])
+    if 'Name_1__id_1' not in company_indexes:
+        companies_col.create_index([("Name", 1), ("_id", 1)])
+    
+    # Permission version checks (covered by the index)
+    if 'CompanyID_1_AccessVersion_1' not in company_indexes:
+        companies_col.create_index([("CompanyID", 1), ("AccessVersion", 1)])
+    
+    # Stats counters: one document per college department
+    if 'CollegeID_1_Department_1' not in stats_indexes:
+        stats_col.create_index([("CollegeID", 1), ("Department", 1)], unique=True)
+    
+    # Access logs: newest-first per user / user type, expired after the retention period
+    if 'UserID_1_Timestamp_-1' not in log_indexes:
+        access_logs_col.create_index([("UserID", 1), ("Timestamp", -1)])
+    if 'UserType_1_Timestamp_-1' not in log_indexes:
+        access_logs_col.create_index([("UserType", 1), ("Timestamp", -1)])
+    ensure_ttl_index(access_logs_col, "Timestamp", ACCESS_LOG_RETENTION_DAYS * 86400)
+    
+    if 'UserID_1_Hour_-1' not in bucket_indexes:
+        access_log_buckets_col.create_index([("UserID", 1), ("Hour", -1)])
+    if 'UserType_1_Hour_-1' not in bucket_indexes:
+        access_log_buckets_col.create_index([("UserType", 1), ("Hour", -1)])
+    ensure_ttl_index(access_log_buckets_col, "Hour", ACCESS_LOG_RETENTION_DAYS * 86400)
+    
+    # Access log rollups: one counter per period/user/action
+    if 'Period_1_Start_1_UserType_1_UserID_1_Action_1' not in rollup_indexes:
+        access_rollups_col.create_index(
+            [("Period", 1), ("Start", 1), ("UserType", 1), ("UserID", 1), ("Action", 1)], unique=True)
+    if 'UserID_1_Action_1_Period_1_Start_1' not in rollup_indexes:
+        access_rollups_col.create_index([("UserID", 1), ("Action", 1), ("Period", 1), ("Start", 1)])
+    if 'UserType_1_Action_1_Period_1_Start_1' not in rollup_indexes:
+        access_rollups_col.create_index([("UserType", 1), ("Action", 1), ("Period", 1), ("Start", 1)])
+    
     print("✓ Indexes verified/created successfully!")
     
 except ConnectionFailure as e:
@@ -0,0 +1,169 @@
+"""
+Block Feed
+In-process broadcast of newly appended blocks.
+createBlock publishes each block header once; any number of streaming
+subscribers wait on a shared condition and read from a ring buffer, so
+serving them costs no database queries.
+"""
+
+import logging
+import math
+from bisect import bisect_right
+from collections import deque
+from threading import Condition, Lock
+
+from chainstore import NodeSelector, block_hash, block_certificates, iter_blocks, read_block_at
+
+logger = logging.getLogger(__name__)
+
+# Number of recent block headers kept in memory for subscribers to catch up from
+FEED_BUFFER_SIZE = 1000
+
+# Maximum number of events returned in one read
+FEED_MAX_EVENTS = 500
+
+
+def poll_timeout(value, maximum):
+    """Seconds a long poll may wait: value clamped to [0, maximum].
+
+    Anything that is not a finite number (missing, garbage, nan, inf) gets
+    maximum; a NaN would otherwise make Condition.wait_for block forever.
+    """
+    try:
+        timeout = float(value)
+    except (TypeError, ValueError):
+        return maximum
+    if not math.isfinite(timeout):
+        return maximum
+    return min(max(timeout, 0.0), maximum)
+
+
+def header_event(block, payload=None):
+    """Block header plus the certificates it anchors, without the certificate data"""
+    certificates = [
+        {'hash': entry['hash'], 'CollegeID': entry.get('CollegeID')}
+        for entry in block_certificates(block, payload)
+    ]
+
+    return {
+        'index': block['index'],
+        'timestamp': block['timestamp'],
+        'previous_hash': block['previous_hash'],
+        'proof': block['proof'],
+        'block_hash': block_hash(block),
+        'certificates': certificates,
+    }
+
+
+class BlockFeed:
+    def __init__(self, maxlen=FEED_BUFFER_SIZE):
+        self._cond = Condition()
+        self._events = deque(maxlen=maxlen)
+        self._tip = None
+        self._primed = False
+        self._prime_lock = Lock()
+        # File offsets of known blocks (sorted by index) on self._node, so
+        # catch-up reads seek to the cursor instead of scanning from the start
+        self._offsets_lock = Lock()
+        self._node = None
+        self._offset_index = []
+        self._offset_start = []
+
+    def _remember(self, node, block, start):
+        with self._offsets_lock:
+            if node != self._node:
+                self._node = node
+                self._offset_index, self._offset_start = [], []
+            if not self._offset_index or block['index'] > self._offset_index[-1]:
+                self._offset_index.append(block['index'])
+                self._offset_start.append(start)
+
+    def _seek(self, node, cursor):
+        """File offset of the first known block that is not after cursor + 1"""
+        with self._offsets_lock:
+            if node != self._node or not self._offset_index:
+                return 0
+            position = bisect_right(self._offset_index, cursor + 1) - 1
+            return self._offset_start[position] if position >= 0 else 0
+
+    def _prime(self):
+        """Load the newest headers from the chain the first time the feed is used.
+
+        Runs outside the condition so publishing is never held up by the
+        scan. Only the newest maxlen blocks are decoded into headers; the
+        rest of the scan just records block offsets.
+        """
+        if self._primed:
+            return
+        with self._prime_lock:
+            if self._primed:
+                return
+            events = []
+            majority = NodeSelector().majority()
+            if majority:
+                node = majority[0]
+                newest = deque(maxlen=self._events.maxlen)
+                try:
+                    for block, start, _ in iter_blocks(node):
+                        self._remember(node, block, start)
+                        newest.append(start)
+                    events = [header_event(read_block_at(node, start)) for start in newest]
+                except (OSError, ValueError) as e:
+                    logger.error(f"Could not prime block feed: {e}")
+                    events = []
+
+            with self._cond:
+                # Keep anything published while the chain was being scanned
+                primed_tip = events[-1]['index'] if events else 0
+                published = [e for e in self._events if e['index'] > primed_tip]
+                self._events.clear()
+                self._events.extend(events + published)
+                self._tip = max(primed_tip, self._tip or 0)
+                self._primed = True
+                self._cond.notify_all()
+
+    def tip(self):
+        """Index of the newest block seen by the feed"""
+        self._prime()
+        with self._cond:
+            return self._tip
+
+    def publish(self, block, payload=None):
+        """Announce a block that has just been written to all nodes"""
+        event = header_event(block, payload)
+        with self._cond:
+            if self._tip is not None and event['index'] <= self._tip:
+                return
+            self._events.append(event)
+            self._tip = event['index']
+            self._cond.notify_all()
+
+    def _from_chain(self, cursor, limit):
+        """Events after cursor read from the chain file, for cursors older than the buffer"""
+        events = []
+        majority = NodeSelector().majority()
+        if not majority:
+            return events
+        node = majority[0]
+        for block, start, _ in iter_blocks(node, self._seek(node, cursor)):
+            self._remember(node, block, start)
+            if block['index'] > cursor:
+                events.append(header_event(block))
+                if len(events) >= limit:
+                    break
+        return events
+
+    def read(self, cursor, timeout=None, limit=FEED_MAX_EVENTS):
+        """Return events after cursor, waiting up to timeout seconds for new ones"""
+        self._prime()
+        with self._cond:
+            if timeout:
+                self._cond.wait_for(lambda: self._tip > cursor, timeout)
+            in_buffer = self._events and cursor >= self._events[0]['index'] - 1
+            if in_buffer or self._tip <= cursor:
+                return [e for e in self._events if e['index'] > cursor][:limit]
+        # Slow catch-up path reads the chain file outside the lock
+        return self._from_chain(cursor, limit)
+
+
+block_feed = BlockFeed()
@@ -51,12 +51,22 @@ def clear_and_setup():
         client = MongoClient(MONGO_URI, serverSelectionTimeoutMS=5000)
         db = client[DATABASE_NAME]
         
+        # Seeded records need change sequence numbers like any other write (delta sync)
+        from models import stamp_changes
+        
         # Get collections
         students_col = db['students']
         colleges_col = db['colleges']
         companies_col = db['companies']
         certificates_col = db['certificates']
         access_logs_col = db['access_logs']
+        stats_col = db['stats']
+        access_log_buckets_col = db['access_log_buckets']
+        certificate_scans_col = db['certificate_scans']
+        access_rollups_col = db['access_rollups']
+        rollup_state_col = db['rollup_state']
+        counters_col = db['counters']
+        deletions_col = db['deletions']
         
         print("\n🗑️  Clearing existing data...")
         students_col.delete_many({})
@@ -64,6 +74,14 @@ def clear_and_setup():
         companies_col.delete_many({})
         certificates_col.delete_many({})
         access_logs_col.delete_many({})
+        access_log_buckets_col.delete_many({})
+        certificate_scans_col.delete_many({})
+        access_rollups_col.delete_many({})
+        rollup_state_col.delete_many({})
+        stats_col.delete_many({})
+        # Restart delta sync: the change counter and tombstones describe the wiped data
+        counters_col.delete_many({})
+        deletions_col.delete_many({})
         print("✅ Database cleared!")
         
         # Create College
@@ -122,7 +140,14 @@ def clear_and_setup():
         ]
         
         for student in students_data:
-            students_col.insert_one(student)
+            student["NameKey"] = " ".join(student["Name"].split()).lower()
+            result = students_col.insert_one(student)
+            stamp_changes(students_col, [result.inserted_id])
+            stats_col.update_one(
+                {"CollegeID": student["CollegeID"], "Department": student["Department"]},
+                {"$inc": {"Students": 1, "Certificates": 0, "PendingBlocks": 0}},
+                upsert=True
+            )
             print(f"✅ Student created: {student['USN']} - {student['Name']}")
         print("   All passwords: student123")
         
@@ -1,13 +1,24 @@
 import base64
 import json
 import os
+import re
 import logging
+import tempfile
 from io import BytesIO
-from datetime import timedelta
-from flask import Flask, render_template, request, redirect, url_for, session, flash, send_file, Response
+from datetime import datetime, timedelta
+from flask import Flask, Request, render_template, request, redirect, url_for, session, flash, send_file, Response, jsonify
 from blockchain import BlockChain
-from models import Student, College, Company, AccessLog
-from config import certificates_col, students_col, colleges_col, companies_col
+from feed import block_feed, poll_timeout
+from cache import verify_page_cache, start_stats_logger
+from bloom import certificate_filter
+from search import highlight
+from streaming import STREAM_FORMATS, stream_format, serialize
+from auth import AuthBusy, AccountLocked
+import student_import
+import certificate_batch
+from models import Student, College, Company, AccessLog, AccessRollup, Stats, CertificateScans, ChangeFeed
+from config import (certificates_col, students_col, colleges_col, VERIFY_MAX_AGE, DOWNLOAD_MAX_AGE,
+                    CERTIFICATE_BATCH_MAX_UPLOAD, BATCH_VERIFY_MAX_IDENTIFIERS)
 from dotenv import load_dotenv
 
 # Load environment variables
@@ -25,7 +36,17 @@ logging.basicConfig(
 
 logger = logging.getLogger(__name__)
 
+class UploadRequest(Request):
+    """Allows the larger CSV + ZIP upload on the batch issuance route only"""
+    
+    @property
+    def max_content_length(self):
+        if self.endpoint == "college_issue_batch":
+            return CERTIFICATE_BATCH_MAX_UPLOAD
+        return super().max_content_length
+
 app = Flask(__name__)
+app.request_class = UploadRequest
 
 # Security configuration
 app.secret_key = os.getenv('SECRET_KEY', os.urandom(32))
@@ -34,6 +55,14 @@ app.config['SESSION_COOKIE_SAMESITE'] = 'Lax'
 app.config['PERMANENT_SESSION_LIFETIME'] = timedelta(hours=2)
 app.config['MAX_CONTENT_LENGTH'] = 10 * 1024 * 1024  # 10MB max file size
 
+# Build the certificate hash Bloom filter in the background
+certificate_filter.start()
+
+# Log verification and permission cache hit rates periodically
+start_stats_logger()
+
+app.add_template_filter(highlight)
+
 # Helper function to check login
 def require_login(user_type=None):
     """Decorator to check if user is logged in"""
@@ -55,7 +84,11 @@ def student_login():
         usn = request.form["usn"]
         password = request.form["password"]
         
-        student = Student.authenticate(usn, password)
+        try:
+            student = Student.authenticate(usn, password)
+        except (AuthBusy, AccountLocked) as e:
+            flash(str(e), "warning")
+            return render_template('student_login.html')
         
         if student:
             session["user_id"] = student["USN"]
@@ -79,11 +112,13 @@ def student_dashboard():
     
     usn = session.get("user_id")
     student = Student.get_by_usn(usn)
-    certificates = Student.get_certificates(usn)
+    certificates, next_cursor = Student.get_certificates_page(
+        usn, request.args.get("after"), request.args.get("limit"))
     
     return render_template('student_dashboard.html', 
                          student=student, 
-                         certificates=certificates)
+                         certificates=certificates,
+                         next_cursor=next_cursor)
 
 @app.route("/student/view_certificate/<cert_hash>")
 def student_view_certificate(cert_hash):
@@ -108,7 +143,11 @@ def college_login():
         college_id = request.form["college_id"]
         password = request.form["password"]
         
-        college = College.authenticate(college_id, password)
+        try:
+            college = College.authenticate(college_id, password)
+        except (AuthBusy, AccountLocked) as e:
+            flash(str(e), "warning")
+            return render_template('college_login.html')
         
         if college:
             session["user_id"] = college["CollegeID"]
@@ -131,21 +170,39 @@ def college_dashboard():
         return redirect(url_for("college_login"))
     
     college_id = session.get("user_id")
-    students = College.get_students(college_id)
-    certificates = College.get_certificates(college_id)
+    stats = Stats.college_counters(college_id)
+    search_term = request.args.get("q", "").strip()
+    search_field = request.args.get("field", "all")
     
-    # Group by department
-    departments = {}
-    for student in students:
-        dept = student.get("Department", "Unknown")
-        if dept not in departments:
-            departments[dept] = 0
-        departments[dept] += 1
+    if search_term:
+        bc = BlockChain()
+        certificates = bc.searchCertificates(search_term, search_field, college_id,
+                                             limit=request.args.get("limit"))
+    else:
+        certificates, _ = College.get_certificates_page(college_id, limit=10)
+    scans = CertificateScans.counts(cert["hash"] for cert in certificates)
     
     return render_template('college_dashboard.html', 
-                         students=students,
+                         stats=stats,
                          certificates=certificates,
-                         departments=departments)
+                         scans=scans,
+                         search_term=search_term,
+                         search_field=search_field)
+
+@app.route("/college/search_certificates")
+def college_search_certificates():
+    """JSON certificate search with ranking and highlight spans"""
+    if not require_login("college"):
+        return jsonify({"error": "Login required"}), 401
+    
+    search_term = request.args.get("q", "").strip()
+    bc = BlockChain()
+    results = bc.searchCertificates(search_term, request.args.get("field", "all"),
+                                    session.get("user_id"), limit=request.args.get("limit"))
+    for cert in results:
+        cert.pop("_id", None)
+    
+    return jsonify({"query": search_term, "results": results})
 
 @app.route("/college/add_student", methods=["GET", "POST"])
 def college_add_student():
@@ -174,6 +231,85 @@ def college_add_student():
     
     return render_template('college_add_student.html')
 
+@app.route("/college/import_students", methods=["GET", "POST"])
+def college_import_students():
+    if not require_login("college"):
+        flash("Please login first", "warning")
+        return redirect(url_for("college_login"))
+    
+    if request.method == "POST":
+        college_id = session.get("user_id")
+        file = request.files.get("students_csv")
+        
+        if not file or file.filename == '':
+            flash("No file selected", "danger")
+            return redirect(url_for('college_import_students'))
+        
+        if not file.filename.lower().endswith('.csv'):
+            flash("Only CSV files are supported", "danger")
+            return redirect(url_for('college_import_students'))
+        
+        # Hashing passwords is slow, so the import runs in the background like certificate batches
+        fd, path = tempfile.mkstemp(prefix="student_import_", suffix=".csv")
+        os.close(fd)
+        try:
+            file.save(path)
+            job = student_import.start_job(college_id, path)
+        except UnicodeDecodeError as e:
+            os.remove(path)
+            flash(f"Could not read CSV: {e}", "danger")
+            return redirect(url_for('college_import_students'))
+        except Exception as e:
+            logger.error(f"Student import upload error: {e}")
+            os.remove(path)
+            flash("Error saving the upload. Please try again.", "danger")
+            return redirect(url_for('college_import_students'))
+        
+        return redirect(url_for('college_import_students_progress', job_id=job.id))
+    
+    return render_template('college_import_students.html')
+
+@app.route("/college/import_students/<job_id>")
+def college_import_students_progress(job_id):
+    if not require_login("college"):
+        flash("Please login first", "warning")
+        return redirect(url_for("college_login"))
+    
+    job = student_import.get_job(job_id, session.get("user_id"))
+    if not job:
+        flash("Import not found", "danger")
+        return redirect(url_for('college_import_students'))
+    
+    job_info = job.to_dict()
+    errors = []
+    if job_info["finished"]:
+        errors = [entry for entry in job.sorted_report() if entry["status"] == "error"]
+    return render_template('college_import_students.html', job=job_info, errors=errors)
+
+@app.route("/college/import_students/<job_id>/status")
+def college_import_students_status(job_id):
+    if not require_login("college"):
+        return jsonify({"error": "Login required"}), 401
+    
+    job = student_import.get_job(job_id, session.get("user_id"))
+    if not job:
+        return jsonify({"error": "Import not found"}), 404
+    return jsonify(job.to_dict())
+
+@app.route("/college/import_students/<job_id>/report")
+def college_import_students_report(job_id):
+    if not require_login("college"):
+        flash("Please login first", "warning")
+        return redirect(url_for("college_login"))
+    
+    job = student_import.get_job(job_id, session.get("user_id"))
+    if not job or not job.finished_at:
+        flash("Report not available", "danger")
+        return redirect(url_for('college_import_students'))
+    
+    return Response(student_import.report_csv(job.sorted_report()), mimetype="text/csv",
+                    headers={"Content-Disposition": f"attachment; filename=import_{job.id}.csv"})
+
 @app.route("/college/add_certificate", methods=["GET", "POST"])
 def college_add_certificate():
     if not require_login("college"):
@@ -229,6 +365,13 @@ def college_add_certificate():
         # Get form data
         try:
             usn = request.form["usn"]
+            
+            # The form no longer lists students, so confirm the USN belongs to this college
+            student = Student.get_by_usn(usn)
+            if not student or student.get("CollegeID") != college_id.upper():
+                flash("Please select a student of your college", "danger")
+                return redirect(url_for('college_add_certificate'))
+            
             student_name = request.form["student_name"]
             department = request.form["department"]
             academic_year = request.form["academic_year"]
@@ -273,9 +416,121 @@ def college_add_certificate():
             logger.error(f"Certificate creation error: {e}")
             flash("An error occurred while creating certificate. Please try again.", "danger")
     
-    # Get students of this college for dropdown
-    students = College.get_students(college_id)
-    return render_template('college_add_certificate.html', students=students)
+    # Students are looked up incrementally through college_lookup_students
+    return render_template('college_add_certificate.html')
+
+@app.route("/college/issue_batch", methods=["GET", "POST"])
+def college_issue_batch():
+    if not require_login("college"):
+        flash("Please login first", "warning")
+        return redirect(url_for("college_login"))
+    
+    if request.method == "POST":
+        college_id = session.get("user_id")
+        csv_file = request.files.get("certificates_csv")
+        zip_file = request.files.get("certificates_zip")
+        
+        if not csv_file or csv_file.filename == '' or not zip_file or zip_file.filename == '':
+            flash("Please select both the CSV file and the ZIP of PDFs", "danger")
+            return redirect(url_for('college_issue_batch'))
+        
+        if not csv_file.filename.lower().endswith('.csv') or not zip_file.filename.lower().endswith('.zip'):
+            flash("Upload a .csv file and a .zip file", "danger")
+            return redirect(url_for('college_issue_batch'))
+        
+        # The batch runs in the background, so keep the uploads on disk until it finishes
+        paths = []
+        try:
+            for upload, suffix in ((csv_file, ".csv"), (zip_file, ".zip")):
+                fd, path = tempfile.mkstemp(prefix="certificate_batch_", suffix=suffix)
+                os.close(fd)
+                paths.append(path)
+                upload.save(path)
+            job = certificate_batch.start_job(college_id, *paths)
+        except Exception as e:
+            logger.error(f"Batch upload error: {e}")
+            for path in paths:
+                os.remove(path)
+            flash("Error saving the upload. Please try again.", "danger")
+            return redirect(url_for('college_issue_batch'))
+        
+        return redirect(url_for('college_issue_batch_progress', job_id=job.id))
+    
+    return render_template('college_issue_batch.html')
+
+@app.route("/college/issue_batch/<job_id>")
+def college_issue_batch_progress(job_id):
+    if not require_login("college"):
+        flash("Please login first", "warning")
+        return redirect(url_for("college_login"))
+    
+    job = certificate_batch.get_job(job_id, session.get("user_id"))
+    if not job:
+        flash("Batch not found", "danger")
+        return redirect(url_for('college_issue_batch'))
+    
+    return render_template('college_issue_batch.html', job=job.to_dict())
+
+@app.route("/college/issue_batch/<job_id>/status")
+def college_issue_batch_status(job_id):
+    if not require_login("college"):
+        return jsonify({"error": "Login required"}), 401
+    
+    job = certificate_batch.get_job(job_id, session.get("user_id"))
+    if not job:
+        return jsonify({"error": "Batch not found"}), 404
+    return jsonify(job.to_dict())
+
+@app.route("/college/issue_batch/<job_id>/report")
+def college_issue_batch_report(job_id):
+    if not require_login("college"):
+        flash("Please login first", "warning")
+        return redirect(url_for("college_login"))
+    
+    job = certificate_batch.get_job(job_id, session.get("user_id"))
+    if not job or not job.finished_at:
+        flash("Report not available", "danger")
+        return redirect(url_for('college_issue_batch'))
+    
+    return Response(certificate_batch.report_csv(job.sorted_report()), mimetype="text/csv",
+                    headers={"Content-Disposition": f"attachment; filename=batch_{job.id}.csv"})
+
+@app.route("/college/students/lookup")
+def college_lookup_students():
+    """Type-ahead student lookup by USN or name prefix"""
+    if not require_login("college"):
+        return jsonify({"error": "Login required"}), 401
+    
+    students = College.lookup_students(session.get("user_id"),
+                                       request.args.get("q", ""),
+                                       request.args.get("limit"))
+    return jsonify({"results": students})
+
+# Columns of the certificate export (the PDF is never exported)
+CERTIFICATE_EXPORT_FIELDS = ["hash", "USN", "Studentname", "Department", "CollegeID",
+                             "AcademicYear", "JoiningDate", "EndDate", "CGPA", "CreatedAt"]
+
+@app.route("/college/export_certificates")
+def college_export_certificates():
+    """Stream all of the college's certificates as CSV or NDJSON"""
+    if not require_login("college"):
+        flash("Please login first", "warning")
+        return redirect(url_for("college_login"))
+    
+    college_id = session.get("user_id")
+    department = request.args.get("department") or None
+    output_format = stream_format(request.args.get("format"))
+    
+    def rows():
+        for certificate in College.iter_certificates(college_id, department):
+            certificate.pop("_id", None)
+            yield certificate
+    
+    AccessLog.log("College", college_id, f"Exported certificates ({output_format})")
+    filename = f"certificates_{college_id}.{output_format}"
+    return Response(serialize(rows(), CERTIFICATE_EXPORT_FIELDS, output_format),
+                    mimetype=STREAM_FORMATS[output_format],
+                    headers={"Content-Disposition": f"attachment; filename={filename}"})
 
 @app.route("/college/view_students")
 def college_view_students():
@@ -286,9 +541,12 @@ def college_view_students():
     college_id = session.get("user_id")
     department = request.args.get("department", None)
     
-    students = College.get_students(college_id, department)
+    students, next_cursor = College.get_students_page(
+        college_id, department, request.args.get("after"), request.args.get("limit"))
     
-    return render_template('college_view_students.html', students=students)
+    return render_template('college_view_students.html',
+                         students=students,
+                         next_cursor=next_cursor)
 
 @app.route("/college/manage_access", methods=["GET", "POST"])
 def college_manage_access():
@@ -317,18 +575,15 @@ def college_manage_access():
         
         return redirect(url_for("college_manage_access"))
     
-    # Get all companies
-    all_companies = list(companies_col.find())
-    
-    # Get companies with access
-    companies_with_access = []
-    for company in all_companies:
-        if "AccessibleColleges" in company and college_id.upper() in company["AccessibleColleges"]:
-            companies_with_access.append(company)
+    # Grantees come from the AccessibleColleges index; the picker is paginated
+    companies_with_access = Company.get_grantees(college_id)
+    all_companies, next_cursor = Company.get_page(
+        college_id, request.args.get("after"), request.args.get("limit"))
     
     return render_template('college_manage_access.html', 
                          all_companies=all_companies,
-                         companies_with_access=companies_with_access)
+                         companies_with_access=companies_with_access,
+                         next_cursor=next_cursor)
 
 # ==================== COMPANY ROUTES ====================
 
@@ -338,7 +593,11 @@ def company_login():
         company_id = request.form["company_id"]
         password = request.form["password"]
         
-        company = Company.authenticate(company_id, password)
+        try:
+            company = Company.authenticate(company_id, password)
+        except (AuthBusy, AccountLocked) as e:
+            flash(str(e), "warning")
+            return render_template('company_login.html')
         
         if company:
             session["user_id"] = company["CompanyID"]
@@ -361,13 +620,21 @@ def company_dashboard():
         return redirect(url_for("company_login"))
     
     company_id = session.get("user_id")
-    company = companies_col.find_one({"CompanyID": company_id})
+    company = Company.get_profile(company_id) or {}
     
-    accessible_colleges = company.get("AccessibleColleges", [])
+    accessible_colleges = company.get("AccessibleColleges", ())
+    
+    # Read from the daily rollups (as of the last rollup_logs.py run)
+    month_start = datetime.now().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    activity = {
+        "verifications_month": AccessRollup.count("verify", user_id=company_id, start=month_start),
+        "verifications_total": AccessRollup.count("verify", user_id=company_id),
+    }
     
     return render_template('company_dashboard.html', 
                          company=company,
-                         accessible_colleges=accessible_colleges)
+                         accessible_colleges=accessible_colleges,
+                         activity=activity)
 
 @app.route("/company/verify_student", methods=["GET", "POST"])
 def company_verify_student():
@@ -384,17 +651,17 @@ def company_verify_student():
         bc = BlockChain()
         results = []
         
+        # Permissions come from the cache, so this is a single certificate query
+        accessible_colleges = Company.accessible_colleges(company_id)
+        
         if search_type == "usn":
-            results = bc.getCertificateByUSN(search_value)
+            results = bc.getCertificateByUSN(search_value, fields="detail",
+                                             college_ids=accessible_colleges)
         elif search_type == "hash":
             cert = bc.getCertificateByHash(search_value)
             if cert:
                 results = [cert]
         
-        # Filter by accessible colleges
-        company = companies_col.find_one({"CompanyID": company_id})
-        accessible_colleges = company.get("AccessibleColleges", [])
-        
         filtered_results = [r for r in results if r.get("CollegeID") in accessible_colleges]
         
         if filtered_results:
@@ -404,6 +671,97 @@ def company_verify_student():
     
     return render_template('company_verify_student.html')
 
+# Columns of batch verification results
+BATCH_VERIFY_FIELDS = ["input", "type", "status", "hash", "USN", "Studentname", "Department",
+                       "CollegeID", "AcademicYear", "JoiningDate", "EndDate", "CGPA", "CreatedAt"]
+
+def batch_identifiers(body):
+    """USNs / hashes from a JSON object, a form field or an uploaded file, without duplicates.
+    
+    Returns None if the JSON "identifiers" is not a list of strings.
+    """
+    if body is not None:
+        values = body.get("identifiers", [])
+        if not isinstance(values, list) or not all(isinstance(value, str) for value in values):
+            return None
+    else:
+        values = re.split(r"[\s,;]+", request.form.get("identifiers", ""))
+        file = request.files.get("identifiers_file")
+        if file and file.filename:
+            values += re.split(r"[\s,;]+", file.read().decode("utf-8-sig", errors="replace"))
+    
+    identifiers = []
+    seen = set()
+    for value in values:
+        value = value.strip().strip('"')
+        # Skip blanks and a header row such as "USN"
+        if not value or value.lower() in ("usn", "hash") or value.upper() in seen:
+            continue
+        seen.add(value.upper())
+        identifiers.append(value)
+    return identifiers
+
+@app.route("/company/verify_batch", methods=["GET", "POST"])
+def company_verify_batch():
+    """Verify many USNs / certificate hashes; results stream back as CSV or NDJSON"""
+    body = request.get_json(silent=True) if request.is_json else None
+    
+    def fail(message, status):
+        if body is not None:
+            return jsonify({"error": message}), status
+        flash(message, "danger")
+        return redirect(url_for('company_verify_batch'))
+    
+    if not require_login("company"):
+        if body is not None:
+            return jsonify({"error": "Login required"}), 401
+        flash("Please login first", "warning")
+        return redirect(url_for("company_login"))
+    
+    if request.method == "GET":
+        return render_template('company_verify_batch.html', max_identifiers=BATCH_VERIFY_MAX_IDENTIFIERS)
+    
+    if body is not None and not isinstance(body, dict):
+        return fail("JSON body must be an object", 400)
+    requested_format = (body or {}).get("format") or request.values.get("format")
+    if requested_format is not None and not isinstance(requested_format, str):
+        return fail('"format" must be a string', 400)
+    
+    company_id = session.get("user_id")
+    identifiers = batch_identifiers(body)
+    if identifiers is None:
+        return fail('"identifiers" must be a list of strings', 400)
+    if not identifiers:
+        return fail("Please provide at least one USN or certificate hash", 400)
+    if len(identifiers) > BATCH_VERIFY_MAX_IDENTIFIERS:
+        return fail(f"At most {BATCH_VERIFY_MAX_IDENTIFIERS} identifiers per batch", 413)
+    
+    output_format = stream_format(requested_format)
+    accessible_colleges = Company.accessible_colleges(company_id)
+    bc = BlockChain()
+    
+    def rows():
+        found = 0
+        try:
+            for value, kind, certificates in bc.verifyCertificates(identifiers, accessible_colleges):
+                if certificates is None:
+                    yield {"input": value, "type": kind, "status": "error"}
+                elif not certificates:
+                    yield {"input": value, "type": kind, "status": "not_found"}
+                else:
+                    found += 1
+                    for certificate in certificates:
+                        certificate.pop("_id", None)
+                        yield dict(certificate, input=value, type=kind, status="verified")
+        finally:
+            # One entry per batch instead of one per identifier
+            AccessLog.log("Company", company_id,
+                          f"Verified batch of {len(identifiers)} identifiers ({found} found)")
+    
+    return Response(serialize(rows(), BATCH_VERIFY_FIELDS, output_format),
+                    mimetype=STREAM_FORMATS[output_format],
+                    headers={"Content-Disposition": f"attachment; filename=verification.{output_format}"})
+
 @app.route("/company/view_students")
 def company_view_students():
     if not require_login("company"):
@@ -411,26 +769,177 @@ def company_view_students():
         return redirect(url_for("company_login"))
     
     company_id = session.get("user_id")
-    company = companies_col.find_one({"CompanyID": company_id})
-    accessible_colleges = company.get("AccessibleColleges", [])
+    accessible_colleges = Company.accessible_colleges(company_id)
+    
+    # Get one page of students from accessible colleges
+    students, next_cursor = Company.get_students_page(
+        accessible_colleges, request.args.get("after"), request.args.get("limit"))
+    stats = Stats.company_overview(accessible_colleges)
+    
+    return render_template('company_view_students.html',
+                         students=students,
+                         stats=stats,
+                         next_cursor=next_cursor)
+
+@app.route("/company/sync")
+def company_sync():
+    """Delta sync: students and certificates created, changed or deleted since the ?since= token.
+    
+    Call without a token to start a full sync, then keep passing "next".
+    Each change is an "upsert" of the record or a "delete" of the USN / hash.
+    "resync" means the changes start from the beginning again (first call,
+    or a college was newly granted); "revoked_colleges" lists colleges whose
+    records should be dropped from the mirror.
+    """
+    if not require_login("company"):
+        return jsonify({"error": "Login required"}), 401
+    
+    accessible_colleges = set(Company.accessible_colleges(session.get("user_id")))
+    since, resync, revoked = 0, True, []
+    
+    token = request.args.get("since")
+    if token:
+        decoded = ChangeFeed.decode_token(token)
+        if decoded is None:
+            return jsonify({"error": "Invalid sync token"}), 400
+        since, synced_colleges = decoded
+        revoked = sorted(set(synced_colleges) - accessible_colleges)
+        if accessible_colleges - set(synced_colleges):
+            # Records of a newly granted college predate the token
+            since = 0
+        else:
+            resync = False
+    
+    changes, last_seq, has_more = ChangeFeed.changes(accessible_colleges, since,
+                                                     request.args.get("limit"))
+    return jsonify({
+        "changes": changes,
+        "next": ChangeFeed.encode_token(last_seq, accessible_colleges),
+        "has_more": has_more,
+        "resync": resync,
+        "revoked_colleges": revoked,
+    })
+
+# ==================== BLOCK FEED ROUTES ====================
+
+FEED_KEEPALIVE_SECONDS = 15
+FEED_POLL_MAX_SECONDS = 30
+
+def feed_cursor():
+    """Cursor from Last-Event-ID or ?cursor=, defaulting to the current chain tip"""
+    value = request.headers.get("Last-Event-ID") or request.args.get("cursor")
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return block_feed.tip()
+
+def feed_visible(event, accessible_colleges):
+    """Limit the anchored certificates in a header to the company's colleges"""
+    visible = dict(event)
+    visible["certificates"] = [c for c in event["certificates"]
+                               if c.get("CollegeID") in accessible_colleges]
+    return visible
+
+@app.route("/feed/blocks")
+def feed_blocks():
+    """Server-sent events stream of new block headers"""
+    if not require_login("company"):
+        return Response("Login required", status=401)
+    
+    company_id = session.get("user_id")
+    cursor = feed_cursor()
+    
+    def generate():
+        nonlocal cursor
+        yield "retry: 5000\n\n"
+        while True:
+            events = block_feed.read(cursor, timeout=FEED_KEEPALIVE_SECONDS)
+            if not events:
+                yield ": keepalive\n\n"
+                continue
+            # Re-read permissions per batch (a version check) so revocations apply to open streams
+            accessible_colleges = set(Company.accessible_colleges(company_id))
+            for event in events:
+                cursor = event["index"]
+                payload = json.dumps(feed_visible(event, accessible_colleges))
+                yield f"id: {cursor}\nevent: block\ndata: {payload}\n\n"
+    
+    return Response(generate(), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.route("/feed/blocks/poll")
+def feed_blocks_poll():
+    """Long-poll alternative to the event stream"""
+    if not require_login("company"):
+        return jsonify({"error": "Login required"}), 401
+    
+    accessible_colleges = set(Company.accessible_colleges(session.get("user_id")))
+    cursor = feed_cursor()
+    timeout = poll_timeout(request.args.get("timeout"), FEED_POLL_MAX_SECONDS)
     
-    # Get all students from accessible colleges
-    students = list(students_col.find({"CollegeID": {"$in": accessible_colleges}}))
+    events = block_feed.read(cursor, timeout=timeout)
+    if events:
+        cursor = events[-1]["index"]
     
-    return render_template('company_view_students.html', students=students)
+    return jsonify({
+        "cursor": cursor,
+        "events": [feed_visible(event, accessible_colleges) for event in events]
+    })
 
 # ==================== COMMON ROUTES ====================
 
+# Bump when verify_success.html changes so cached pages are revalidated
+VERIFY_PAGE_VERSION = 1
+
+def verify_etag(cert_hash):
+    return f"verify-v{VERIFY_PAGE_VERSION}-{cert_hash}"
+
+def download_etag(cert_hash):
+    return f"pdf-{cert_hash}"
+
+def not_modified(etag, cache_control):
+    """304 response for a conditional request whose ETag still matches"""
+    response = Response(status=304)
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = cache_control
+    return response
+
 @app.route("/verify/<cert_hash>")
 def public_verify(cert_hash):
     """Public certificate verification"""
-    bc = BlockChain()
-    certificate = bc.getCertificateByHash(cert_hash)
+    etag = verify_etag(cert_hash)
+    cache_control = f"public, max-age={VERIFY_MAX_AGE}"
     
-    if certificate:
-        return render_template('verify_success.html', cert=certificate)
-    else:
-        return render_template('verify_fraud.html')
+    page = verify_page_cache.get(cert_hash)
+    if page is None:
+        bc = BlockChain()
+        
+        # The filter lags certificates issued by other processes, so a negative
+        # is confirmed with an index-only lookup before showing the fraud page
+        if not certificate_filter.might_contain(cert_hash):
+            if not bc.certificateExists(cert_hash):
+                return render_template('verify_fraud.html'), {"Cache-Control": "no-cache"}
+            certificate_filter.add(cert_hash)
+        
+        certificate = bc.getCertificateByHash(cert_hash)
+        
+        if not certificate:
+            return render_template('verify_fraud.html'), {"Cache-Control": "no-cache"}
+    
+    # Only genuine certificates are counted, so forged hashes cannot grow the counters
+    CertificateScans.record(cert_hash)
+    
+    if request.if_none_match.contains(etag):
+        return not_modified(etag, cache_control)
+    
+    if page is None:
+        page = render_template('verify_success.html', cert=certificate).encode()
+        verify_page_cache.set(cert_hash, page)
+    
+    response = Response(page, mimetype='text/html')
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = cache_control
+    return response
 
 @app.route("/logout")
 def logout():
@@ -447,17 +956,30 @@ def logout():
 @app.route("/download_certificate/<cert_hash>")
 def download_certificate(cert_hash):
     bc = BlockChain()
-    certificate = bc.getCertificateByHash(cert_hash)
+    etag = download_etag(cert_hash)
+    cache_control = f"public, max-age={DOWNLOAD_MAX_AGE}, immutable"
+    
+    # A client that already holds this PDF only needs to know it still exists,
+    # which the cached detail lookup answers without loading the file
+    if request.if_none_match.contains(etag):
+        if bc.getCertificateByHash(cert_hash):
+            return not_modified(etag, cache_control)
+    
+    certificate = bc.getCertificateByHash(cert_hash, fields="download")
     
     if certificate and certificate.get("CertificateFile"):
         try:
             bytes_io = BytesIO(base64.b64decode(certificate["CertificateFile"]))
-            return send_file(
+            response = send_file(
                 bytes_io,
                 download_name=f'certificate_{certificate["USN"]}.pdf',
                 as_attachment=True,
-                mimetype='application/pdf'
+                mimetype='application/pdf',
+                etag=etag,
+                conditional=False
             )
+            response.headers["Cache-Control"] = cache_control
+            return response
         except Exception as e:
             logger.error(f"Error downloading certificate: {e}")
             flash(f"Error downloading certificate: {e}", "danger")
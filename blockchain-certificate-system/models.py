@@ -1,30 +1,224 @@
-from config import students_col, colleges_col, companies_col, certificates_col, access_logs_col
-import bcrypt
+from config import (students_col, colleges_col, companies_col, certificates_col, access_logs_col,
+                    stats_col, access_log_buckets_col, access_rollups_col, rollup_state_col,
+                    certificate_scans_col, counters_col, deletions_col, SCAN_FLUSH_SECONDS, SCAN_MAX_PENDING,
+                    ACCESS_CACHE_SIZE, ACCESS_CACHE_TTL, ACCESS_LOG_BATCH_SIZE,
+                    ACCESS_LOG_FLUSH_SECONDS, ACCESS_LOG_QUEUE_SIZE, ACCESS_LOG_OVERFLOW,
+                    ACCESS_LOG_STORAGE, ACCESS_LOG_BUCKET_SIZE, ROLLUP_LAG_SECONDS,
+                    EXPORT_PAGE_SIZE, SYNC_PAGE_SIZE, SYNC_SETTLE_SECONDS)
+from pymongo import UpdateOne, ReturnDocument
+from cache import VersionedCache, register_cache
+from writers import BufferedWriter, CounterBuffer
+import auth
+from bson import json_util
+from bson.errors import BSONError
+import base64
+import binascii
 import datetime
+import json
 import logging
+import re
 
 logger = logging.getLogger(__name__)
 
+# Named field sets for certificate queries. Only "download" carries the
+# base64 CertificateFile; list and detail views never transfer the PDF.
+_CERTIFICATE_LIST_FIELDS = [
+    "hash", "USN", "Studentname", "Department", "CollegeID",
+    "AcademicYear", "JoiningDate", "EndDate", "CGPA", "CreatedAt"
+]
+
+CERTIFICATE_FIELDS = {
+    "list": {field: 1 for field in _CERTIFICATE_LIST_FIELDS},
+    "detail": dict(
+        {field: 1 for field in _CERTIFICATE_LIST_FIELDS + ["Skills", "Personality"]},
+        HasCertificateFile={"$gt": [
+            {"$strLenBytes": {"$ifNull": ["$CertificateFile", ""]}}, 0
+        ]}
+    ),
+    "download": {"hash": 1, "USN": 1, "CertificateFile": 1},
+}
+
+def certificate_projection(fields):
+    """Projection for a named certificate field set"""
+    try:
+        return CERTIFICATE_FIELDS[fields]
+    except KeyError:
+        raise ValueError(f"Unknown certificate field set: {fields}")
+
+def anchored(query):
+    """Restrict a certificate query to certificates that are on the chain.
+    
+    Batch certificates are stored with Pending set and only lose it once
+    their manifest block is written, so they cannot be listed or verified
+    before then.
+    """
+    return dict(query, Pending={"$exists": False})
+
+# Student fields shown in listings (never the password hash)
+STUDENT_LIST_FIELDS = {
+    field: 1 for field in
+    ["USN", "Name", "Department", "CollegeID", "Email", "Phone", "Status", "CreatedAt"]
+}
+
+# Student type-ahead lookup
+STUDENT_LOOKUP_FIELDS = {"_id": 0, "USN": 1, "Name": 1, "Department": 1}
+DEFAULT_LOOKUP_LIMIT = 10
+MAX_LOOKUP_LIMIT = 50
+
+def name_key(name):
+    """Normalized student name used for case-insensitive prefix lookups"""
+    return " ".join(str(name or "").split()).lower()
+
+# Keyset pagination
+DEFAULT_PAGE_SIZE = 25
+MAX_PAGE_SIZE = 100
+
+def page_size(limit):
+    """Clamp a requested page size to the allowed range"""
+    try:
+        limit = int(limit)
+    except (TypeError, ValueError):
+        return DEFAULT_PAGE_SIZE
+    return max(1, min(limit, MAX_PAGE_SIZE))
+
+def encode_cursor(doc, sort_field):
+    """Opaque cursor for the position right after doc"""
+    position = json_util.dumps([doc.get(sort_field), doc["_id"]])
+    return base64.urlsafe_b64encode(position.encode()).decode()
+
+def decode_cursor(token):
+    """Decode a cursor; returns (value, _id) or None if it is invalid"""
+    try:
+        value, last_id = json_util.loads(base64.urlsafe_b64decode(token.encode()).decode())
+        return value, last_id
+    except (binascii.Error, ValueError, TypeError, LookupError, BSONError):
+        # json_util raises InvalidId (a BSONError) or IndexError on malformed $oid / $date
+        return None
+
+def _after_position(query, sort_field, direction, position):
+    """Restrict query to documents after position, a (value, _id) pair"""
+    if not position:
+        return query
+    value, last_id = position
+    op = "$gt" if direction == 1 else "$lt"
+    return {"$and": [query, {"$or": [
+        {sort_field: {op: value}},
+        {sort_field: value, "_id": {op: last_id}}
+    ]}]}
+
+def paginate(collection, query, sort_field, direction=1, after=None, limit=None, projection=None):
+    """Keyset page ordered by (sort_field, _id).
+
+    Returns (items, next_cursor); next_cursor is None on the last page.
+    Each page is an index seek, so its cost does not grow with the page number.
+    """
+    limit = page_size(limit)
+    position = decode_cursor(after) if after else None
+    query = _after_position(query, sort_field, direction, position)
+
+    items = list(collection.find(query, projection)
+                 .sort([(sort_field, direction), ("_id", direction)])
+                 .limit(limit + 1))
+
+    next_cursor = None
+    if len(items) > limit:
+        items = items[:limit]
+        next_cursor = encode_cursor(items[-1], sort_field)
+    return items, next_cursor
+
+def iter_pages(collection, query, sort_field, direction=1, projection=None,
+               batch_size=EXPORT_PAGE_SIZE):
+    """Yield every matching document, fetched one keyset page at a time.
+
+    Memory is bounded by batch_size, and no server cursor stays open while
+    a slow consumer (such as a download) works through a page.
+    """
+    position = None
+    while True:
+        page = list(collection.find(_after_position(query, sort_field, direction, position), projection)
+                    .sort([(sort_field, direction), ("_id", direction)])
+                    .limit(batch_size))
+        yield from page
+        if len(page) < batch_size:
+            return
+        position = (page[-1].get(sort_field), page[-1]["_id"])
+
+# Change sequence shared by students and certificates (delta sync). Every
+# create, change or delete takes the next number, so "changed since N" is an
+# index seek. Numbers are taken after the write has landed, so the only write
+# still in flight when a number is handed out is the stamp itself.
+CHANGE_SEQUENCE = "changes"
+
+def reserve_changes(count=1):
+    """Reserve count consecutive change sequence numbers; returns the first"""
+    counter = counters_col.find_one_and_update(
+        {"_id": CHANGE_SEQUENCE}, {"$inc": {"Value": count}},
+        upsert=True, return_document=ReturnDocument.AFTER
+    )
+    return counter["Value"] - count + 1
+
+def stamp_changes(collection, values, field="_id"):
+    """Give written documents (matched by field) the next change sequence numbers, in order.
+    
+    Returns False if the stamp failed; build_sync_index.py stamps anything left over.
+    """
+    if not values:
+        return True
+    try:
+        first_seq = reserve_changes(len(values))
+        now = datetime.datetime.now()
+        collection.bulk_write([
+            UpdateOne({field: value}, {"$set": {"ChangeSeq": first_seq + i, "UpdatedAt": now}})
+            for i, value in enumerate(values)
+        ], ordered=False)
+        return True
+    except Exception as e:
+        logger.error(f"Change sequence update failed for {len(values)} {collection.name}: {e}")
+        return False
+
+def delete_synced(collection, kind, field, values):
+    """Delete documents matched by field, leaving a tombstone for each one that
+    was already stamped so delta sync mirrors drop it too"""
+    query = {field: {"$in": list(values)}}
+    synced = list(collection.find(dict(query, ChangeSeq={"$exists": True}),
+                                  {"_id": 0, field: 1, "CollegeID": 1}))
+    collection.delete_many(query)
+    if not synced:
+        return
+    try:
+        first_seq = reserve_changes(len(synced))
+        now = datetime.datetime.now()
+        deletions_col.insert_many([
+            {"Type": kind, "CollegeID": doc["CollegeID"], field: doc[field],
+             "ChangeSeq": first_seq + i, "UpdatedAt": now}
+            for i, doc in enumerate(synced)
+        ])
+    except Exception as e:
+        logger.error(f"Could not record {len(synced)} deleted {kind} records for sync: {e}")
+
 class Student:
     @staticmethod
     def create(usn, name, department, college_id, email, phone, password):
         """Create new student"""
         try:
-            password_hash = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt())
+            password_hash = auth.hash_password(password)
             
             student = {
                 "USN": usn.upper(),
                 "Name": name,
+                "NameKey": name_key(name),
                 "Department": department,
                 "CollegeID": college_id.upper(),
                 "Email": email,
                 "Phone": phone,
-                "Password": password_hash.decode('utf-8'),
+                "Password": password_hash,
                 "CreatedAt": datetime.datetime.now(),
                 "Status": "Active"
             }
             
             result = students_col.insert_one(student)
+            stamp_changes(students_col, [result.inserted_id])
+            Stats.increment(student["CollegeID"], department, students=1)
             return result.inserted_id
         except Exception as e:
             logger.error(f"Error creating student: {e}")
@@ -34,13 +228,9 @@ class Student:
     def authenticate(usn, password):
         """Authenticate student"""
         try:
-            student = students_col.find_one({
-                "USN": usn.upper(),
-                "Status": "Active"
-            })
-            if student and bcrypt.checkpw(password.encode('utf-8'), 
-                                         student['Password'].encode('utf-8')):
-                return student
+            return auth.authenticate(students_col, "USN", usn, password)
+        except (auth.AuthBusy, auth.AccountLocked):
+            raise
         except Exception as e:
             logger.error(f"Authentication error: {e}")
         return None
@@ -51,9 +241,16 @@ class Student:
         return students_col.find_one({"USN": usn.upper()})
     
     @staticmethod
-    def get_certificates(usn):
+    def get_certificates(usn, fields="list"):
         """Get all certificates for a student"""
-        return list(certificates_col.find({"USN": usn.upper()}).sort("CreatedAt", -1))
+        return list(certificates_col.find(anchored({"USN": usn.upper()}), certificate_projection(fields))
+                    .sort("CreatedAt", -1))
+    
+    @staticmethod
+    def get_certificates_page(usn, after=None, limit=None):
+        """Get one page of a student's certificates, newest first"""
+        return paginate(certificates_col, anchored({"USN": usn.upper()}), "CreatedAt", -1,
+                        after, limit, certificate_projection("list"))
 
 
 class College:
@@ -61,7 +258,7 @@ class College:
     def create(college_id, name, email, phone, address, password):
         """Create new college"""
         try:
-            password_hash = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt())
+            password_hash = auth.hash_password(password)
             
             college = {
                 "CollegeID": college_id.upper(),
@@ -69,9 +266,11 @@ class College:
                 "Email": email,
                 "Phone": phone,
                 "Address": address,
-                "Password": password_hash.decode('utf-8'),
+                "Password": password_hash,
                 "CreatedAt": datetime.datetime.now(),
-                "Status": "Active"
+                "Status": "Active",
+                # A new college has no records, so its (empty) counters are complete
+                "StatsBuiltAt": datetime.datetime.now()
             }
             
             result = colleges_col.insert_one(college)
@@ -84,13 +283,9 @@ class College:
     def authenticate(college_id, password):
         """Authenticate college"""
         try:
-            college = colleges_col.find_one({
-                "CollegeID": college_id.upper(),
-                "Status": "Active"
-            })
-            if college and bcrypt.checkpw(password.encode('utf-8'), 
-                                         college['Password'].encode('utf-8')):
-                return college
+            return auth.authenticate(colleges_col, "CollegeID", college_id, password)
+        except (auth.AuthBusy, auth.AccountLocked):
+            raise
         except Exception as e:
             logger.error(f"Authentication error: {e}")
         return None
@@ -104,13 +299,75 @@ class College:
         return list(students_col.find(query).sort("Name", 1))
     
     @staticmethod
-    def get_certificates(college_id, department=None):
+    def lookup_students(college_id, term, limit=None):
+        """Students whose USN or name starts with term, USN matches first.
+        
+        Both are anchored prefix regexes on indexed fields, so each is a
+        bounded index range scan.
+        """
+        try:
+            limit = max(1, min(int(limit), MAX_LOOKUP_LIMIT))
+        except (TypeError, ValueError):
+            limit = DEFAULT_LOOKUP_LIMIT
+        
+        term = str(term or "").strip()
+        if not term:
+            return []
+        
+        college_id = college_id.upper()
+        try:
+            results = list(students_col.find(
+                {"CollegeID": college_id, "USN": {"$regex": "^" + re.escape(term.upper())}},
+                STUDENT_LOOKUP_FIELDS).sort("USN", 1).limit(limit))
+            
+            if len(results) < limit:
+                seen = {student["USN"] for student in results}
+                by_name = students_col.find(
+                    {"CollegeID": college_id, "NameKey": {"$regex": "^" + re.escape(name_key(term))}},
+                    STUDENT_LOOKUP_FIELDS).sort("NameKey", 1).limit(limit)
+                for student in by_name:
+                    if student["USN"] not in seen and len(results) < limit:
+                        results.append(student)
+            return results
+        except Exception as e:
+            logger.error(f"Student lookup failed: {e}")
+            return []
+    
+    @staticmethod
+    def get_students_page(college_id, department=None, after=None, limit=None):
+        """Get one page of a college's students ordered by name"""
+        query = {"CollegeID": college_id.upper()}
+        if department:
+            query["Department"] = department
+        return paginate(students_col, query, "Name", 1, after, limit, STUDENT_LIST_FIELDS)
+    
+    @staticmethod
+    def get_certificates(college_id, department=None, fields="list"):
         """Get all certificates of a college"""
         query = {"CollegeID": college_id.upper()}
         if department:
             query["Department"] = department
         # Return sorted by creation date (newest first)
-        return list(certificates_col.find(query).sort("CreatedAt", -1))
+        return list(certificates_col.find(anchored(query), certificate_projection(fields))
+                    .sort("CreatedAt", -1))
+    
+    @staticmethod
+    def get_certificates_page(college_id, department=None, after=None, limit=None):
+        """Get one page of a college's certificates, newest first"""
+        query = {"CollegeID": college_id.upper()}
+        if department:
+            query["Department"] = department
+        return paginate(certificates_col, anchored(query), "CreatedAt", -1,
+                        after, limit, certificate_projection("list"))
+    
+    @staticmethod
+    def iter_certificates(college_id, department=None):
+        """Stream a college's certificates (list fields, never the PDF), newest first"""
+        query = {"CollegeID": college_id.upper()}
+        if department:
+            query["Department"] = department
+        return iter_pages(certificates_col, anchored(query), "CreatedAt", -1,
+                          certificate_projection("list"))
 
 
 class Company:
@@ -118,7 +375,7 @@ class Company:
     def create(company_id, name, email, phone, industry, password):
         """Create new company"""
         try:
-            password_hash = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt())
+            password_hash = auth.hash_password(password)
             
             company = {
                 "CompanyID": company_id.upper(),
@@ -126,7 +383,7 @@ class Company:
                 "Email": email,
                 "Phone": phone,
                 "Industry": industry,
-                "Password": password_hash.decode('utf-8'),
+                "Password": password_hash,
                 "CreatedAt": datetime.datetime.now(),
                 "Status": "Active",
                 "AccessibleColleges": []
@@ -142,13 +399,9 @@ class Company:
     def authenticate(company_id, password):
         """Authenticate company"""
         try:
-            company = companies_col.find_one({
-                "CompanyID": company_id.upper(),
-                "Status": "Active"
-            })
-            if company and bcrypt.checkpw(password.encode('utf-8'), 
-                                         company['Password'].encode('utf-8')):
-                return company
+            return auth.authenticate(companies_col, "CompanyID", company_id, password)
+        except (auth.AuthBusy, auth.AccountLocked):
+            raise
         except Exception as e:
             logger.error(f"Authentication error: {e}")
         return None
@@ -159,12 +412,15 @@ class Company:
         try:
             companies_col.update_one(
                 {"CompanyID": company_id.upper()},
-                {"$addToSet": {"AccessibleColleges": college_id.upper()}}
+                {"$addToSet": {"AccessibleColleges": college_id.upper()},
+                 "$inc": {"AccessVersion": 1}}
             )
             return True
         except Exception as e:
             logger.error(f"Error granting access: {e}")
             return False
+        finally:
+            company_access.invalidate(company_id.upper())
     
     @staticmethod
     def revoke_access(company_id, college_id):
@@ -172,26 +428,226 @@ class Company:
         try:
             companies_col.update_one(
                 {"CompanyID": company_id.upper()},
-                {"$pull": {"AccessibleColleges": college_id.upper()}}
+                {"$pull": {"AccessibleColleges": college_id.upper()},
+                 "$inc": {"AccessVersion": 1}}
             )
             return True
         except Exception as e:
             logger.error(f"Error revoking access: {e}")
             return False
+        finally:
+            company_access.invalidate(company_id.upper())
+    
+    @staticmethod
+    def _load_profile(company_id):
+        """Company profile and permissions as cached by company_access"""
+        company = companies_col.find_one({"CompanyID": company_id}, COMPANY_PROFILE_FIELDS)
+        if not company:
+            return None
+        company["AccessibleColleges"] = tuple(company.get("AccessibleColleges", []))
+        return company
+    
+    @staticmethod
+    def _access_version(company_id):
+        """Grant/revoke counter shared by all workers (index-only read)"""
+        company = companies_col.find_one({"CompanyID": company_id},
+                                         {"_id": 0, "CompanyID": 1, "AccessVersion": 1})
+        return company.get("AccessVersion", 0) if company else None
+    
+    @staticmethod
+    def get_profile(company_id):
+        """Cached company profile (no password) with its AccessibleColleges"""
+        profile = company_access.get(company_id.upper())
+        return dict(profile) if profile else None
+    
+    @staticmethod
+    def accessible_colleges(company_id):
+        """Cached tuple of college IDs the company may read"""
+        profile = company_access.get(company_id.upper())
+        return profile["AccessibleColleges"] if profile else ()
+    
+    @staticmethod
+    def get_students_page(college_ids, after=None, limit=None):
+        """Get one page of students from the given colleges ordered by name"""
+        query = {"CollegeID": {"$in": list(college_ids)}}
+        return paginate(students_col, query, "Name", 1, after, limit, STUDENT_LIST_FIELDS)
+    
+    @staticmethod
+    def get_grantees(college_id):
+        """Companies that have been granted access to a college"""
+        try:
+            return list(companies_col.find({"AccessibleColleges": college_id.upper()},
+                                           COMPANY_CARD_FIELDS).sort("Name", 1))
+        except Exception as e:
+            logger.error(f"Error loading grantees: {e}")
+            return []
+    
+    @staticmethod
+    def get_page(exclude_college=None, after=None, limit=None):
+        """Get one page of companies ordered by name, optionally without a college's grantees"""
+        query = {"AccessibleColleges": {"$ne": exclude_college.upper()}} if exclude_college else {}
+        return paginate(companies_col, query, "Name", 1, after, limit, COMPANY_CARD_FIELDS)
     
     @staticmethod
     def can_access(company_id, college_id):
         """Check if company has access to college"""
-        company = companies_col.find_one({"CompanyID": company_id.upper()})
-        if company and "AccessibleColleges" in company:
-            return college_id.upper() in company["AccessibleColleges"]
-        return False
+        return college_id.upper() in Company.accessible_colleges(company_id)
+
+
+# Company fields shown on the manage-access page
+COMPANY_CARD_FIELDS = {"CompanyID": 1, "Name": 1, "Industry": 1, "Email": 1}
+
+# Company fields kept in the permission cache
+COMPANY_PROFILE_FIELDS = {
+    "_id": 0, "CompanyID": 1, "Name": 1, "Email": 1, "Phone": 1,
+    "Industry": 1, "Status": 1, "AccessibleColleges": 1
+}
+
+# Company profiles keyed by CompanyID; grant_access/revoke_access bump AccessVersion,
+# which every lookup checks, so changes apply to all workers immediately
+company_access = register_cache("company_access",
+                                VersionedCache(Company._load_profile, ACCESS_CACHE_SIZE, ACCESS_CACHE_TTL,
+                                               remote_version=Company._access_version))
+
+
+class Stats:
+    @staticmethod
+    def increment(college_id, department, students=0, certificates=0, pending_blocks=0):
+        """Atomically adjust the counters of a college department"""
+        try:
+            stats_col.update_one(
+                {"CollegeID": college_id.upper(), "Department": department or "Unknown"},
+                {"$inc": {
+                    "Students": students,
+                    "Certificates": certificates,
+                    "PendingBlocks": pending_blocks
+                }},
+                upsert=True
+            )
+        except Exception as e:
+            logger.error(f"Error updating stats: {e}")
+    
+    @staticmethod
+    def _summarize(counters):
+        """Fold per-department counter documents into totals"""
+        summary = {"students": 0, "certificates": 0, "pending_blocks": 0, "departments": {}}
+        for doc in counters:
+            dept = summary["departments"].setdefault(doc["Department"], {"students": 0, "certificates": 0})
+            dept["students"] += doc.get("Students", 0)
+            dept["certificates"] += doc.get("Certificates", 0)
+            summary["students"] += doc.get("Students", 0)
+            summary["certificates"] += doc.get("Certificates", 0)
+            summary["pending_blocks"] += doc.get("PendingBlocks", 0)
+        summary["departments"] = dict(sorted(
+            (name, counts) for name, counts in summary["departments"].items()
+            if counts["students"] or counts["certificates"]
+        ))
+        return summary
+    
+    @staticmethod
+    def ensure_built(college_ids):
+        """Rebuild the counters of colleges whose stats were never built.
+        
+        Colleges that existed before the stats collection only have the
+        partial counters upserted by later $inc calls until they are rebuilt.
+        """
+        for college in colleges_col.find({"CollegeID": {"$in": list(college_ids)},
+                                          "StatsBuiltAt": {"$exists": False}}, {"CollegeID": 1}):
+            Stats.rebuild(college["CollegeID"])
+    
+    @staticmethod
+    def college_counters(college_id):
+        """Dashboard statistics for a college read from the stats collection"""
+        Stats.ensure_built([college_id.upper()])
+        return Stats._summarize(stats_col.find({"CollegeID": college_id.upper()}))
+    
+    @staticmethod
+    def rebuild(college_id=None):
+        """Recompute the stats collection from students and certificates.
+        
+        The counters are read first, the records are counted, and the
+        difference is applied with $inc, so increments that land after the
+        count are kept. An increment racing the count itself can be counted
+        twice; run rebuild_stats.py while writes are quiesced for exact totals.
+        """
+        match = {"CollegeID": college_id.upper()} if college_id else {}
+        group = {"_id": {"CollegeID": "$CollegeID", "Department": "$Department"}, "count": {"$sum": 1}}
+        
+        current = {
+            (doc["CollegeID"], doc["Department"]): doc
+            for doc in stats_col.find(match, {"CollegeID": 1, "Department": 1, "Students": 1, "Certificates": 1})
+        }
+        
+        # Departments that no longer have any records drop to zero
+        counters = {key: {"Students": 0, "Certificates": 0} for key in current}
+        for field, collection in (("Students", students_col), ("Certificates", certificates_col)):
+            for row in collection.aggregate([{"$match": match}, {"$group": group}]):
+                key = (row["_id"].get("CollegeID"), row["_id"].get("Department") or "Unknown")
+                counters.setdefault(key, {"Students": 0, "Certificates": 0})[field] = row["count"]
+        
+        operations = []
+        for (cid, dept), counts in counters.items():
+            before = current.get((cid, dept), {})
+            delta = {field: count - before.get(field, 0) for field, count in counts.items()
+                     if count != before.get(field, 0)}
+            if delta:
+                operations.append(UpdateOne({"CollegeID": cid, "Department": dept},
+                                            {"$inc": delta, "$setOnInsert": {"PendingBlocks": 0}},
+                                            upsert=True))
+        if operations:
+            stats_col.bulk_write(operations, ordered=False)
+        colleges_col.update_many(match, {"$set": {"StatsBuiltAt": datetime.datetime.now()}})
+        return len(counters)
+    
+    @staticmethod
+    def company_overview(college_ids):
+        """Student total and departments across accessible colleges"""
+        Stats.ensure_built(college_ids)
+        summary = Stats._summarize(stats_col.find({"CollegeID": {"$in": list(college_ids)}}))
+        return {
+            "students": summary["students"],
+            "departments": [name for name, counts in summary["departments"].items() if counts["students"]]
+        }
+
+
+def _write_log_buckets(batch):
+    """Append log entries to per-user hourly bucket documents"""
+    groups = {}
+    for log in batch:
+        hour = log["Timestamp"].replace(minute=0, second=0, microsecond=0)
+        entry = {"Action": log["Action"], "Details": log["Details"], "Timestamp": log["Timestamp"]}
+        groups.setdefault((log["UserType"], log["UserID"], hour), []).append(entry)
+    
+    operations = []
+    for (user_type, user_id, hour), entries in groups.items():
+        for start in range(0, len(entries), ACCESS_LOG_BUCKET_SIZE):
+            chunk = entries[start:start + ACCESS_LOG_BUCKET_SIZE]
+            # A full bucket no longer matches, so the upsert starts a new one
+            operations.append(UpdateOne(
+                {"UserType": user_type, "UserID": user_id, "Hour": hour,
+                 "Count": {"$lte": ACCESS_LOG_BUCKET_SIZE - len(chunk)}},
+                {"$push": {"Entries": {"$each": chunk}},
+                 "$inc": {"Count": len(chunk)},
+                 "$max": {"Last": chunk[-1]["Timestamp"]}},
+                upsert=True
+            ))
+    access_log_buckets_col.bulk_write(operations, ordered=False)
 
+# Access log entries are written in batches by a background thread
+access_log_writer = BufferedWriter(
+    access_logs_col,
+    batch_size=ACCESS_LOG_BATCH_SIZE,
+    flush_interval=ACCESS_LOG_FLUSH_SECONDS,
+    max_queue=ACCESS_LOG_QUEUE_SIZE,
+    overflow=ACCESS_LOG_OVERFLOW,
+    name="access-log-writer",
+    write_batch=_write_log_buckets if ACCESS_LOG_STORAGE == "buckets" else None
+)
 
 class AccessLog:
     @staticmethod
     def log(user_type, user_id, action, details=""):
-        """Log access activity"""
+        """Log access activity (queued; written by access_log_writer)"""
         log = {
             "UserType": user_type,
             "UserID": user_id,
@@ -200,17 +656,320 @@ class AccessLog:
             "Timestamp": datetime.datetime.now()
         }
         try:
-            access_logs_col.insert_one(log)
+            access_log_writer.write(log)
         except Exception as e:
             logger.error(f"Error logging access: {e}")
     
     @staticmethod
     def get_logs(user_id=None, user_type=None, limit=100):
         """Get access logs"""
+        # Include entries still waiting in this process's write queue
+        access_log_writer.flush()
+        
         query = {}
         if user_id:
             query["UserID"] = user_id
         if user_type:
             query["UserType"] = user_type
         
-        return list(access_logs_col.find(query).sort("Timestamp", -1).limit(limit))
\ No newline at end of file
+        if ACCESS_LOG_STORAGE == "buckets":
+            return AccessLog._get_bucketed_logs(query, limit)
+        
+        # Served newest-first from the (UserID|UserType, Timestamp) indexes
+        return list(access_logs_col.find(query).sort("Timestamp", -1).limit(limit))
+    
+    @staticmethod
+    def _get_bucketed_logs(query, limit):
+        """Newest entries from hourly buckets, flattened to log documents"""
+        logs = []
+        oldest_hour = None
+        for bucket in access_log_buckets_col.find(query).sort("Hour", -1):
+            # Keep reading until a full hour past the point where limit was reached
+            if len(logs) >= limit and bucket["Hour"] < oldest_hour:
+                break
+            oldest_hour = bucket["Hour"]
+            for entry in bucket.get("Entries", []):
+                logs.append(dict(entry, UserType=bucket["UserType"], UserID=bucket["UserID"]))
+        
+        logs.sort(key=lambda log: log["Timestamp"], reverse=True)
+        return logs[:limit]
+    
+    @staticmethod
+    def iter_entries(start, end):
+        """Stream (UserType, UserID, Action, Timestamp) entries with start <= Timestamp < end"""
+        if ACCESS_LOG_STORAGE == "buckets":
+            hour = start.replace(minute=0, second=0, microsecond=0)
+            buckets = access_log_buckets_col.find({"Hour": {"$gte": hour, "$lt": end}})
+            for bucket in buckets:
+                for entry in bucket.get("Entries", []):
+                    if start <= entry["Timestamp"] < end:
+                        yield bucket["UserType"], bucket["UserID"], entry["Action"], entry["Timestamp"]
+            return
+        
+        cursor = access_logs_col.find({"Timestamp": {"$gte": start, "$lt": end}},
+                                      {"_id": 0, "UserType": 1, "UserID": 1, "Action": 1, "Timestamp": 1})
+        for log in cursor.batch_size(5000):
+            yield log["UserType"], log["UserID"], log["Action"], log["Timestamp"]
+
+
+# Access log actions grouped into rollup categories by their fixed prefix
+ROLLUP_ACTIONS = [
+    ("Verified student", "verify"),
+    ("Verified batch", "verify_batch"),
+    ("Added certificate", "add_certificate"),
+    ("Issued certificate batch", "issue_certificates"),
+    ("Added student", "add_student"),
+    ("Imported students", "import_students"),
+    ("Exported certificates", "export_certificates"),
+    ("Granted access", "grant_access"),
+    ("Revoked access", "revoke_access"),
+    ("Login", "login"),
+    ("Logout", "logout"),
+]
+
+def rollup_action(action):
+    """Normalized action category, dropping per-entry details such as the USN"""
+    for prefix, category in ROLLUP_ACTIONS:
+        if action.startswith(prefix):
+            return category
+    return "other"
+
+def _hour_start(moment):
+    return moment.replace(minute=0, second=0, microsecond=0)
+
+def _day_start(moment):
+    return moment.replace(hour=0, minute=0, second=0, microsecond=0)
+
+class AccessRollup:
+    """Hourly and daily access counts per UserType/UserID/action.
+
+    Each run recomputes whole hours from the high-water mark up to
+    now - ROLLUP_LAG_SECONDS and overwrites their counters ($set, not $inc),
+    then re-derives the affected days from the hourly counters. A run that
+    stops part-way can simply be repeated without double counting.
+    """
+    
+    STATE_ID = "access_rollup"
+    
+    @staticmethod
+    def high_water():
+        state = rollup_state_col.find_one({"_id": AccessRollup.STATE_ID})
+        return state["HighWater"] if state else None
+    
+    @staticmethod
+    def run(lag_seconds=ROLLUP_LAG_SECONDS, now=None):
+        """Fold new access log entries into rollups; returns the number of hours processed"""
+        upto = (now or datetime.datetime.now()) - datetime.timedelta(seconds=lag_seconds)
+        high_water = AccessRollup.high_water()
+        if high_water is None:
+            first = access_logs_col.find_one({}, {"Timestamp": 1}, sort=[("Timestamp", 1)])
+            if ACCESS_LOG_STORAGE == "buckets":
+                first = access_log_buckets_col.find_one({}, {"Hour": 1}, sort=[("Hour", 1)])
+                first = first and {"Timestamp": first["Hour"]}
+            if not first:
+                return 0
+            high_water = first["Timestamp"]
+        if high_water >= upto:
+            return 0
+        
+        hours = 0
+        days = set()
+        hour = _hour_start(high_water)
+        while hour < upto:
+            end = min(hour + datetime.timedelta(hours=1), upto)
+            AccessRollup._rollup_hour(hour, end)
+            days.add(_day_start(hour))
+            hours += 1
+            
+            # Save progress after each hour so an interrupted run resumes here
+            rollup_state_col.update_one({"_id": AccessRollup.STATE_ID},
+                                        {"$set": {"HighWater": end, "UpdatedAt": datetime.datetime.now()}},
+                                        upsert=True)
+            hour += datetime.timedelta(hours=1)
+        
+        for day in sorted(days):
+            AccessRollup._rollup_day(day)
+        return hours
+    
+    @staticmethod
+    def _rollup_hour(hour, end):
+        counts = {}
+        for user_type, user_id, action, _ in AccessLog.iter_entries(hour, end):
+            key = (user_type, user_id, rollup_action(action))
+            counts[key] = counts.get(key, 0) + 1
+        AccessRollup._write("hour", hour, counts)
+    
+    @staticmethod
+    def _rollup_day(day):
+        counts = {}
+        hourly = access_rollups_col.find(
+            {"Period": "hour", "Start": {"$gte": day, "$lt": day + datetime.timedelta(days=1)}},
+            {"_id": 0, "UserType": 1, "UserID": 1, "Action": 1, "Count": 1})
+        for row in hourly:
+            key = (row["UserType"], row["UserID"], row["Action"])
+            counts[key] = counts.get(key, 0) + row["Count"]
+        AccessRollup._write("day", day, counts)
+    
+    @staticmethod
+    def _write(period, start, counts):
+        operations = [
+            UpdateOne({"Period": period, "Start": start, "UserType": user_type,
+                       "UserID": user_id, "Action": action},
+                      {"$set": {"Count": count}}, upsert=True)
+            for (user_type, user_id, action), count in counts.items()
+        ]
+        if operations:
+            access_rollups_col.bulk_write(operations, ordered=False)
+    
+    @staticmethod
+    def _match(action, user_id, user_type, start, end, period):
+        match = {"Period": period}
+        if action:
+            match["Action"] = action
+        if user_id:
+            match["UserID"] = user_id
+        if user_type:
+            match["UserType"] = user_type
+        if start or end:
+            match["Start"] = {}
+            if start:
+                match["Start"]["$gte"] = start
+            if end:
+                match["Start"]["$lt"] = end
+        return match
+    
+    @staticmethod
+    def count(action=None, user_id=None, user_type=None, start=None, end=None, period="day"):
+        """Total of rolled-up counters matching the filters"""
+        match = AccessRollup._match(action, user_id, user_type, start, end, period)
+        try:
+            result = list(access_rollups_col.aggregate([
+                {"$match": match},
+                {"$group": {"_id": None, "count": {"$sum": "$Count"}}}
+            ]))
+            return result[0]["count"] if result else 0
+        except Exception as e:
+            logger.error(f"Error reading access rollups: {e}")
+            return 0
+    
+    @staticmethod
+    def series(action=None, user_id=None, user_type=None, start=None, end=None, period="day"):
+        """[(Start, Count)] per period, oldest first"""
+        match = AccessRollup._match(action, user_id, user_type, start, end, period)
+        try:
+            rows = access_rollups_col.aggregate([
+                {"$match": match},
+                {"$group": {"_id": "$Start", "count": {"$sum": "$Count"}}},
+                {"$sort": {"_id": 1}}
+            ])
+            return [(row["_id"], row["count"]) for row in rows]
+        except Exception as e:
+            logger.error(f"Error reading access rollups: {e}")
+            return []
+
+
+# Verification scans per certificate hash, coalesced in memory and flushed in bulk
+scan_counter = CounterBuffer(
+    certificate_scans_col,
+    field="Scans",
+    flush_interval=SCAN_FLUSH_SECONDS,
+    max_keys=SCAN_MAX_PENDING,
+    name="scan-counter"
+)
+
+class CertificateScans:
+    @staticmethod
+    def record(cert_hash):
+        """Count one verification of an issued certificate (no database write here)"""
+        scan_counter.add(cert_hash)
+    
+    @staticmethod
+    def counts(cert_hashes):
+        """Scan counts for the given hashes, including increments not yet flushed"""
+        cert_hashes = list(cert_hashes)
+        counts = {cert_hash: scan_counter.pending(cert_hash) for cert_hash in cert_hashes}
+        try:
+            for doc in certificate_scans_col.find({"_id": {"$in": cert_hashes}}, {"Scans": 1}):
+                counts[doc["_id"]] += doc.get("Scans", 0)
+        except Exception as e:
+            logger.error(f"Error reading scan counts: {e}")
+        return counts
+
+# Delta sync responses
+MAX_SYNC_PAGE_SIZE = 2000
+SYNC_STUDENT_FIELDS = dict(STUDENT_LIST_FIELDS, ChangeSeq=1, UpdatedAt=1, _id=0)
+SYNC_CERTIFICATE_FIELDS = dict(CERTIFICATE_FIELDS["list"], ChangeSeq=1, UpdatedAt=1, _id=0)
+SYNC_DELETION_FIELDS = {"_id": 0}
+
+def sync_page_size(limit):
+    """Clamp a requested number of changes to the allowed range"""
+    try:
+        limit = int(limit)
+    except (TypeError, ValueError):
+        return SYNC_PAGE_SIZE
+    return max(1, min(limit, MAX_SYNC_PAGE_SIZE))
+
+class ChangeFeed:
+    """Students and certificates created, changed or deleted after a sync token.
+
+    Each change has op "upsert" (data is the record) or "delete" (data holds
+    the record's USN or hash and CollegeID). A token holds the last delivered ChangeSeq and the colleges that were
+    visible when it was issued, so newly granted and revoked colleges can
+    be detected on the next call.
+    """
+
+    @staticmethod
+    def encode_token(seq, college_ids):
+        token = json.dumps({"seq": seq, "colleges": sorted(college_ids)})
+        return base64.urlsafe_b64encode(token.encode()).decode()
+
+    @staticmethod
+    def decode_token(token):
+        """(seq, college_ids) or None if the token is invalid"""
+        try:
+            data = json.loads(base64.urlsafe_b64decode(token.encode()).decode())
+            return int(data["seq"]), list(data["colleges"])
+        except (binascii.Error, ValueError, TypeError, KeyError, AttributeError):
+            return None
+
+    @staticmethod
+    def changes(college_ids, since=0, limit=None, settle_seconds=SYNC_SETTLE_SECONDS):
+        """Changes after sequence number since, oldest first.
+
+        Returns (changes, last_seq, has_more). Changes younger than
+        settle_seconds are held back, and so is everything after them, so a
+        slower write that took an earlier number cannot be skipped.
+        """
+        limit = sync_page_size(limit)
+        college_ids = list(college_ids)
+        if not college_ids:
+            return [], since, False
+
+        query = {"CollegeID": {"$in": college_ids}, "ChangeSeq": {"$gt": since}}
+        merged = []
+        for kind, collection, projection in (("student", students_col, SYNC_STUDENT_FIELDS),
+                                             ("certificate", certificates_col, SYNC_CERTIFICATE_FIELDS),
+                                             (None, deletions_col, SYNC_DELETION_FIELDS)):
+            for doc in collection.find(query, projection).sort("ChangeSeq", 1).limit(limit + 1):
+                merged.append((doc["ChangeSeq"], kind, doc))
+        merged.sort(key=lambda item: item[0])
+
+        cutoff = datetime.datetime.now() - datetime.timedelta(seconds=settle_seconds)
+        changes = []
+        last_seq = since
+        has_more = False
+        for seq, kind, doc in merged:
+            if len(changes) >= limit:
+                has_more = True
+                break
+            if doc.get("UpdatedAt") and doc["UpdatedAt"] > cutoff:
+                break
+            for key, value in doc.items():
+                if isinstance(value, datetime.datetime):
+                    doc[key] = value.isoformat()
+            if kind is None:
+                changes.append({"type": doc.pop("Type"), "op": "delete", "seq": seq, "data": doc})
+            else:
+                changes.append({"type": kind, "op": "upsert", "seq": seq, "data": doc})
+            last_seq = seq
+        return changes, last_seq, has_more
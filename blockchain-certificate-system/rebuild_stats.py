@@ -0,0 +1,37 @@
+"""
+Rebuild Dashboard Stats
+Recomputes the stats collection (per college/department counters)
+from the students and certificates collections. Run it while no students
+or certificates are being written for exact totals.
+
+Usage:
+    python rebuild_stats.py            # all colleges
+    python rebuild_stats.py ABC001     # one college
+"""
+
+import sys
+from models import Stats
+
+
+def main():
+    college_id = sys.argv[1] if len(sys.argv) > 1 else None
+
+    print("\n" + "📊 REBUILD STATS ".center(70, "="))
+    if college_id:
+        print(f"Rebuilding counters for college {college_id.upper()}...")
+    else:
+        print("Rebuilding counters for all colleges...")
+
+    try:
+        count = Stats.rebuild(college_id)
+        print(f"✅ Rebuilt {count} department counters")
+    except Exception as e:
+        print(f"\n❌ Error: {e}")
+        import traceback
+        traceback.print_exc()
+
+    print("=" * 70 + "\n")
+
+
+if __name__ == "__main__":
+    main()
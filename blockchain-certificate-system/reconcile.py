@@ -0,0 +1,350 @@
+"""
+Mongo <-> Chain Reconciliation
+Finds certificates stored in MongoDB that never made it onto the chain, and
+chain entries that have no MongoDB record.
+
+Both sides are streamed in hash order: MongoDB through a batched cursor on the
+unique hash index, the chain through a sorted on-disk block index that is
+extended incrementally as new blocks are appended. Memory stays bounded and
+progress is saved, so a run can stop after --limit hashes and the next run
+picks up where it left off.
+
+Repairs append blocks under the same file lock as the app, so --repair can
+run next to a live server. Certificates younger than --grace-seconds are
+left alone because the app may still be anchoring them.
+
+Usage:
+    python reconcile.py                    # report differences
+    python reconcile.py --repair           # report and repair differences
+    python reconcile.py --repair --grace-seconds 3600
+    python reconcile.py --limit 100000     # compare at most N hashes this run
+    python reconcile.py --report out.ndjson
+    python reconcile.py --reset            # forget saved progress and index
+"""
+
+import argparse
+import datetime
+import heapq
+import json
+import logging
+import os
+import tempfile
+
+from chainstore import (block_hash, block_certificate_hashes, block_payload,
+                        certificate_digest, chain_payload, is_batch_payload, iter_blocks,
+                        read_block_at, NodeSelector, NODE_NAMES)
+from search import search_tokens
+
+logger = logging.getLogger(__name__)
+
+STATE_DIR = './reconcile'
+STATE_FILE = os.path.join(STATE_DIR, 'state.json')
+INDEX_FILE = os.path.join(STATE_DIR, 'chain_index.tsv')
+
+DEFAULT_BATCH_SIZE = 1000
+SORT_RUN_SIZE = 100000
+
+# Certificates stored more recently than this are not re-anchored by --repair
+REPAIR_GRACE_SECONDS = 600
+
+
+def load_state():
+    """Load saved reconciliation progress"""
+    if os.path.exists(STATE_FILE):
+        with open(STATE_FILE, 'r') as f:
+            return json.load(f)
+    return {}
+
+
+def save_state(state):
+    """Persist reconciliation progress atomically"""
+    os.makedirs(STATE_DIR, exist_ok=True)
+    temp_file = STATE_FILE + '.tmp'
+    with open(temp_file, 'w') as f:
+        json.dump(state, f, indent=2)
+    os.replace(temp_file, STATE_FILE)
+
+
+def _write_run(entries):
+    """Write a sorted run of index entries to a temp file"""
+    entries.sort()
+    fd, path = tempfile.mkstemp(dir=STATE_DIR, suffix='.run')
+    with os.fdopen(fd, 'w') as f:
+        for entry in entries:
+            f.write('\t'.join(str(part) for part in entry) + '\n')
+    return path
+
+
+def _read_index(path):
+    """Stream (hash, block_index, offset) entries from a sorted index file"""
+    if not os.path.exists(path):
+        return
+    with open(path, 'r') as f:
+        for line in f:
+            cert_hash, index, offset = line.rstrip('\n').split('\t')
+            yield cert_hash, int(index), int(offset)
+
+
+def update_chain_index(state, node):
+    """Extend the sorted chain index with blocks appended since the last run"""
+    os.makedirs(STATE_DIR, exist_ok=True)
+    chain = state.get('chain', {})
+
+    offset = chain.get('offset', 0)
+    if offset and chain.get('node') == node:
+        # Make sure the file was only appended to since we last looked
+        try:
+            last = read_block_at(node, chain['last_start'])
+            unchanged = block_hash(last) == chain['last_hash']
+        except (ValueError, OSError):
+            unchanged = False
+        if not unchanged:
+            logger.warning("Chain file changed layout, rebuilding block index")
+            offset = 0
+    else:
+        offset = 0
+
+    if offset == 0:
+        chain = {'node': node}
+        if os.path.exists(INDEX_FILE):
+            os.remove(INDEX_FILE)
+
+    runs = []
+    entries = []
+    added = 0
+    last = None
+    for block, start, end in iter_blocks(node, offset):
+        for cert_hash in block_certificate_hashes(block):
+            entries.append((cert_hash, block['index'], start))
+            added += 1
+            if len(entries) >= SORT_RUN_SIZE:
+                runs.append(_write_run(entries))
+                entries = []
+        last = (block, start, end)
+
+    if entries:
+        runs.append(_write_run(entries))
+
+    if runs:
+        streams = [_read_index(INDEX_FILE)] + [_read_index(run) for run in runs]
+        fd, merged = tempfile.mkstemp(dir=STATE_DIR, suffix='.tsv')
+        with os.fdopen(fd, 'w') as f:
+            for entry in heapq.merge(*streams):
+                f.write('\t'.join(str(part) for part in entry) + '\n')
+        os.replace(merged, INDEX_FILE)
+        for run in runs:
+            os.remove(run)
+
+    if last:
+        block, start, end = last
+        chain.update({
+            'offset': end,
+            'last_start': start,
+            'last_hash': block_hash(block),
+            'last_index': block['index'],
+        })
+    state['chain'] = chain
+    return added
+
+
+def _mongo_hashes(after, batch_size):
+    """Stream certificate hashes from MongoDB in index order"""
+    from config import certificates_col
+
+    query = {"hash": {"$gt": after}} if after else {}
+    cursor = certificates_col.find(query, {"_id": 0, "hash": 1}) \
+        .sort("hash", 1).batch_size(batch_size)
+    for doc in cursor:
+        yield doc["hash"]
+
+
+def _chain_hashes(after):
+    """Stream (hash, block_index, offset) from the chain index, skipping duplicates"""
+    previous = None
+    for cert_hash, index, offset in _read_index(INDEX_FILE):
+        if after and cert_hash <= after:
+            continue
+        if cert_hash == previous:
+            continue
+        previous = cert_hash
+        yield cert_hash, index, offset
+
+
+def compare(after, batch_size, limit=None):
+    """Merge-join both sides in hash order.
+
+    Yields (kind, hash, chain_entry) for every difference, where kind is
+    'missing_on_chain' or 'missing_in_mongo', and finally ('done', last_hash,
+    finished) to report where the scan stopped.
+    """
+    mongo = _mongo_hashes(after, batch_size)
+    chain = _chain_hashes(after)
+    m = next(mongo, None)
+    c = next(chain, None)
+    seen = 0
+    last = after
+
+    while m is not None or c is not None:
+        if limit and seen >= limit:
+            yield 'done', last, False
+            return
+
+        if c is None or (m is not None and m < c[0]):
+            yield 'missing_on_chain', m, None
+            last = m
+            m = next(mongo, None)
+        elif m is None or c[0] < m:
+            yield 'missing_in_mongo', c[0], c
+            last = c[0]
+            c = next(chain, None)
+        else:
+            last = m
+            m = next(mongo, None)
+            c = next(chain, None)
+        seen += 1
+
+    yield 'done', last, True
+
+
+def repair_missing_on_chain(cert_hash, grace_seconds=REPAIR_GRACE_SECONDS):
+    """Anchor a MongoDB certificate that has no block"""
+    from blockchain import BlockChain, BlockchainError
+    from config import certificates_col
+
+    doc = certificates_col.find_one({"hash": cert_hash})
+    if not doc:
+        return False
+    age = datetime.datetime.now(datetime.timezone.utc) - doc["_id"].generation_time
+    if age.total_seconds() < grace_seconds:
+        logger.info(f"Skipping {cert_hash}: stored {int(age.total_seconds())}s ago, may still be anchoring")
+        return False
+    if certificate_digest(doc) != cert_hash:
+        logger.error(f"Refusing to anchor {cert_hash}: stored data does not match its hash")
+        return False
+    try:
+        BlockChain().createBlock(chain_payload(doc))
+        return True
+    except BlockchainError as e:
+        logger.error(f"Failed to anchor {cert_hash}: {e}")
+        return False
+
+
+def repair_missing_in_mongo(cert_hash, node, offset):
+    """Restore a MongoDB record from the data stored on the chain"""
+    from config import certificates_col
+    from models import stamp_changes
+
+    payload = block_payload(read_block_at(node, offset))
+    if is_batch_payload(payload):
+        logger.error(f"Cannot restore {cert_hash}: batch blocks only hold the certificate manifest")
+        return False
+    if not payload or payload.get('hash') != cert_hash:
+        return False
+    if certificate_digest(payload) != cert_hash:
+        logger.error(f"Refusing to restore {cert_hash}: block data does not match its hash")
+        return False
+    payload["SearchTokens"] = search_tokens(payload)
+    try:
+        result = certificates_col.insert_one(payload)
+        stamp_changes(certificates_col, [result.inserted_id])
+        return True
+    except Exception as e:
+        logger.error(f"Failed to restore {cert_hash}: {e}")
+        return False
+
+
+def reconcile(node=None, batch_size=DEFAULT_BATCH_SIZE, limit=None,
+              repair=False, report=None, grace_seconds=REPAIR_GRACE_SECONDS):
+    """Run one incremental reconciliation pass and return a summary"""
+    state = load_state()
+    if node is None:
+        # Stay on the node we indexed before, unless it is no longer in the majority
+        majority = NodeSelector().majority()
+        previous = state.get('chain', {}).get('node')
+        node = previous if previous in majority else (majority or NODE_NAMES)[0]
+    added = update_chain_index(state, node)
+    cursor = state.get('cursor', '')
+
+    summary = {
+        'indexed_certificates': added,
+        'missing_on_chain': 0,
+        'missing_in_mongo': 0,
+        'repaired': 0,
+        'finished': False,
+    }
+
+    report_file = open(report, 'a') if report else None
+    try:
+        for kind, cert_hash, entry in compare(cursor, batch_size, limit):
+            if kind == 'done':
+                summary['finished'] = entry
+                state['cursor'] = '' if entry else cert_hash
+                if entry:
+                    state['passes'] = state.get('passes', 0) + 1
+                break
+
+            summary[kind] += 1
+            record = {'type': kind, 'hash': cert_hash}
+            if entry:
+                record['block'] = entry[1]
+
+            if repair:
+                if kind == 'missing_on_chain':
+                    record['repaired'] = repair_missing_on_chain(cert_hash, grace_seconds)
+                else:
+                    record['repaired'] = repair_missing_in_mongo(cert_hash, node, entry[2])
+                if record['repaired']:
+                    summary['repaired'] += 1
+
+            print(json.dumps(record))
+            if report_file:
+                report_file.write(json.dumps(record) + '\n')
+    finally:
+        if report_file:
+            report_file.close()
+        save_state(state)
+
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Reconcile MongoDB certificates with the blockchain")
+    parser.add_argument('--node', default=None,
+                        help="Chain node to reconcile against (default: a majority node)")
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument('--limit', type=int, default=None,
+                        help="Compare at most this many hashes, then save progress")
+    parser.add_argument('--repair', action='store_true', help="Repair differences")
+    parser.add_argument('--grace-seconds', type=int, default=REPAIR_GRACE_SECONDS,
+                        help="Do not anchor certificates stored more recently than this")
+    parser.add_argument('--report', help="Append differences to this NDJSON file")
+    parser.add_argument('--reset', action='store_true', help="Forget saved progress and index")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO,
+                        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    if args.reset:
+        for path in (STATE_FILE, INDEX_FILE):
+            if os.path.exists(path):
+                os.remove(path)
+        print("✓ Reconciliation state cleared")
+
+    summary = reconcile(args.node, args.batch_size, args.limit, args.repair, args.report,
+                        args.grace_seconds)
+
+    print("\n" + "=" * 70)
+    print(f"  Certificates indexed this run: {summary['indexed_certificates']}")
+    print(f"  In MongoDB, not on chain: {summary['missing_on_chain']}")
+    print(f"  On chain, not in MongoDB: {summary['missing_in_mongo']}")
+    if args.repair:
+        print(f"  Repaired: {summary['repaired']}")
+    if summary['finished']:
+        print("✅ Full pass complete")
+    else:
+        print("⏸️  Stopped at limit; run again to continue")
+    print("=" * 70)
+
+
+if __name__ == "__main__":
+    main()
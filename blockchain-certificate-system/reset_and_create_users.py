@@ -6,7 +6,9 @@ Run this script to fix the password authentication issue
 import os
 import json
 from models import Student, College, Company
-from config import students_col, colleges_col, companies_col, certificates_col, access_logs_col
+from config import (students_col, colleges_col, companies_col, certificates_col, access_logs_col, stats_col,
+                    access_log_buckets_col, certificate_scans_col, access_rollups_col, rollup_state_col,
+                    counters_col, deletions_col)
 
 def clear_database():
     """Clear all existing data"""
@@ -17,6 +19,14 @@ def clear_database():
         companies_col.delete_many({})
         certificates_col.delete_many({})
         access_logs_col.delete_many({})
+        access_log_buckets_col.delete_many({})
+        certificate_scans_col.delete_many({})
+        access_rollups_col.delete_many({})
+        rollup_state_col.delete_many({})
+        stats_col.delete_many({})
+        # Restart delta sync: the change counter and tombstones describe the wiped data
+        counters_col.delete_many({})
+        deletions_col.delete_many({})
         print("✓ Database cleared successfully!")
     except Exception as e:
         print(f"✗ Error clearing database: {e}")
@@ -0,0 +1,37 @@
+"""
+Access Log Rollups
+Folds raw access log entries into hourly and daily counters
+(access_rollups) used by the activity statistics. Safe to run from cron
+as often as needed; each run continues from the saved high-water mark.
+
+Usage:
+    python rollup_logs.py              # roll up new entries
+    python rollup_logs.py --reset      # forget progress and recompute everything
+"""
+
+import sys
+from config import rollup_state_col
+from models import AccessRollup
+
+
+def main():
+    print("\n" + "📈 ACCESS LOG ROLLUP ".center(70, "="))
+
+    try:
+        if "--reset" in sys.argv[1:]:
+            rollup_state_col.delete_one({"_id": AccessRollup.STATE_ID})
+            print("✓ Rollup progress reset")
+
+        hours = AccessRollup.run()
+        print(f"✅ Rolled up {hours} hours of access logs")
+        print(f"✓ High-water mark: {AccessRollup.high_water()}")
+    except Exception as e:
+        print(f"\n❌ Error: {e}")
+        import traceback
+        traceback.print_exc()
+
+    print("=" * 70 + "\n")
+
+
+if __name__ == "__main__":
+    main()
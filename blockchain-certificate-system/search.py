@@ -0,0 +1,164 @@
+"""
+Certificate Search
+Maintains a token index on each certificate document so searches are
+index lookups instead of unanchored regex scans.
+
+SearchTokens holds field-prefixed tokens:
+    n:<prefix>   edge n-grams of each word of the student name
+    d:<prefix>   edge n-grams of each word of the department
+    u:<part>     substrings of the USN (partial USN lookups)
+    n=/d=/u=     exact words, used to rank exact matches first
+Tokens live only in MongoDB; they are not part of the certificate hash
+and never go on the chain.
+"""
+
+import re
+from markupsafe import Markup, escape
+
+# Longest prefix stored per word; longer query words are verified after the lookup
+MAX_PREFIX = 15
+MIN_USN_PART = 2
+
+DEFAULT_SEARCH_LIMIT = 20
+MAX_SEARCH_LIMIT = 100
+
+# Which token prefix each searchable field uses
+SEARCH_FIELDS = {
+    "Studentname": "n",
+    "USN": "u",
+    "Department": "d",
+}
+
+_WORD = re.compile(r"[0-9a-z]+")
+
+
+def _words(text):
+    return _WORD.findall(str(text or "").lower())
+
+
+def _edge_ngrams(tag, word):
+    return {f"{tag}:{word[:i]}" for i in range(1, min(len(word), MAX_PREFIX) + 1)}
+
+
+def _substrings(tag, word):
+    parts = {f"{tag}:{word[:1]}"} if word else set()
+    for start in range(len(word)):
+        for end in range(start + MIN_USN_PART, min(len(word), start + MAX_PREFIX) + 1):
+            parts.add(f"{tag}:{word[start:end]}")
+    return parts
+
+
+def search_tokens(doc):
+    """Token list for a certificate or student document"""
+    tokens = set()
+    for word in _words(doc.get("Studentname") or doc.get("Name")):
+        tokens |= _edge_ngrams("n", word)
+        tokens.add(f"n={word}")
+    for word in _words(doc.get("Department")):
+        tokens |= _edge_ngrams("d", word)
+        tokens.add(f"d={word}")
+    for word in _words(doc.get("USN")):
+        tokens |= _substrings("u", word)
+        tokens.add(f"u={word}")
+    return sorted(tokens)
+
+
+def _query_token(tag, word, exact=False):
+    if exact:
+        return f"{tag}={word}"
+    return f"{tag}:{word[:MAX_PREFIX]}"
+
+
+def token_query(search_term, search_field="Studentname", exact=False):
+    """MongoDB condition on SearchTokens, or None if the term has no searchable words"""
+    words = _words(search_term)
+    if not words:
+        return None
+
+    if search_field == "all":
+        tags = list(SEARCH_FIELDS.values())
+    else:
+        tags = [SEARCH_FIELDS[search_field]]
+
+    # Every word must match; with several fields, any field may match it
+    conditions = [{"SearchTokens": {"$in": [_query_token(tag, word, exact) for tag in tags]}}
+                  for word in words]
+    return conditions[0] if len(conditions) == 1 else {"$and": conditions}
+
+
+def _field_spans(field, text, words):
+    """Character spans of text matched by the query words"""
+    spans = []
+    lowered = str(text or "").lower()
+    for word in words:
+        if field == "USN":
+            start = lowered.find(word)
+            while start != -1:
+                spans.append([start, start + len(word)])
+                start = lowered.find(word, start + 1)
+        else:
+            for match in _WORD.finditer(lowered):
+                if match.group().startswith(word):
+                    spans.append([match.start(), match.start() + len(word)])
+
+    merged = []
+    for start, end in sorted(spans):
+        if merged and start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return merged
+
+
+def match_certificate(doc, search_term, search_field="Studentname"):
+    """Score and highlight a candidate; returns None if it does not really match.
+
+    The token lookup truncates long words to MAX_PREFIX, so candidates are
+    re-checked here against the full query words.
+    """
+    words = _words(search_term)
+    fields = list(SEARCH_FIELDS) if search_field == "all" else [search_field]
+
+    highlights = {}
+    score = 0
+    for word in words:
+        word_score = 0
+        for field in fields:
+            spans = _field_spans(field, doc.get(field), [word])
+            if not spans:
+                continue
+            highlights.setdefault(field, []).extend(spans)
+            field_words = _words(doc.get(field))
+            if word in field_words:
+                word_score = max(word_score, 3)
+            elif any(w.startswith(word) for w in field_words):
+                word_score = max(word_score, 2)
+            else:
+                word_score = max(word_score, 1)
+        if not word_score:
+            return None
+        score += word_score
+
+    return score, {field: _field_spans(field, doc.get(field), words) for field in highlights}
+
+
+def search_limit(limit):
+    """Clamp a requested result count to the allowed range"""
+    try:
+        limit = int(limit)
+    except (TypeError, ValueError):
+        return DEFAULT_SEARCH_LIMIT
+    return max(1, min(limit, MAX_SEARCH_LIMIT))
+
+
+def highlight(text, spans):
+    """Jinja filter: escape text and wrap highlighted spans in <mark>"""
+    text = str(text or "")
+    parts = []
+    position = 0
+    for start, end in spans or []:
+        parts.append(escape(text[position:start]))
+        parts.append(Markup("<mark>") + escape(text[start:end]) + Markup("</mark>"))
+        position = end
+    parts.append(escape(text[position:]))
+    return Markup("").join(parts)
@@ -84,10 +84,14 @@ def setup_users():
         client = MongoClient(MONGO_URI, serverSelectionTimeoutMS=5000)
         db = client[DATABASE_NAME]
         
+        # Seeded records need change sequence numbers like any other write (delta sync)
+        from models import stamp_changes
+        
         # Get collections
         students_col = db['students']
         colleges_col = db['colleges']
         companies_col = db['companies']
+        stats_col = db['stats']
         
         # Create College if doesn't exist
         print("\n📚 Checking College...")
@@ -146,7 +150,14 @@ def setup_users():
                 student_info["Password"] = bcrypt.hashpw("student123".encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
                 student_info["CreatedAt"] = datetime.datetime.now()
                 student_info["Status"] = "Active"
-                students_col.insert_one(student_info)
+                student_info["NameKey"] = " ".join(student_info["Name"].split()).lower()
+                result = students_col.insert_one(student_info)
+                stamp_changes(students_col, [result.inserted_id])
+                stats_col.update_one(
+                    {"CollegeID": student_info["CollegeID"], "Department": student_info["Department"]},
+                    {"$inc": {"Students": 1, "Certificates": 0, "PendingBlocks": 0}},
+                    upsert=True
+                )
                 print(f"✅ Student created: {student_info['USN']} - {student_info['Name']}")
         
         print("   All student passwords: student123")
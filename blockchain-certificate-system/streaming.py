@@ -0,0 +1,52 @@
+"""
+Streaming Responses
+Serializes rows one at a time as CSV or NDJSON so large result sets are
+sent as they are read instead of being built in memory first.
+"""
+
+import csv
+import io
+import json
+
+# Supported output formats and their MIME types
+STREAM_FORMATS = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+}
+
+
+def stream_format(requested, default="csv"):
+    """Normalized output format name"""
+    requested = (requested or "").lower()
+    return requested if requested in STREAM_FORMATS else default
+
+
+def csv_lines(rows, fieldnames):
+    """Yield a CSV header and one CSV line per row dict"""
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=fieldnames, extrasaction="ignore")
+
+    def take():
+        value = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+        return value
+
+    writer.writeheader()
+    yield take()
+    for row in rows:
+        writer.writerow(row)
+        yield take()
+
+
+def ndjson_lines(rows):
+    """Yield one JSON document per line"""
+    for row in rows:
+        yield json.dumps(row, default=str) + "\n"
+
+
+def serialize(rows, fieldnames, output_format):
+    """Generator of response chunks in the given format"""
+    if output_format == "ndjson":
+        return ndjson_lines(rows)
+    return csv_lines(rows, fieldnames)
@@ -0,0 +1,334 @@
+"""
+Bulk Student Import
+Creates students from a CSV file with columns
+    USN, Name, Department, Email, Phone, Password
+
+Rows are streamed and validated, passwords are hashed in parallel on a
+shared thread pool (bcrypt releases the GIL), and each batch is written
+with one unordered insert_many, so a duplicate USN only fails its own row.
+Every row gets a result in the report. Uploads from the app run as
+background jobs whose progress is polled.
+
+Usage:
+    python student_import.py ABC001 students.csv
+    python student_import.py ABC001 students.csv --report report.csv
+"""
+
+import argparse
+import csv
+import datetime
+import io
+import logging
+import os
+import re
+import sys
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from threading import Lock, Thread
+
+from pymongo.errors import BulkWriteError
+
+from auth import hash_password
+from config import students_col, IMPORT_HASH_WORKERS
+from models import name_key, stamp_changes, AccessLog, Stats
+
+logger = logging.getLogger(__name__)
+
+IMPORT_COLUMNS = ["USN", "Name", "Department", "Email", "Phone", "Password"]
+IMPORT_BATCH_SIZE = 500
+
+# Finished jobs kept for progress and report lookups
+MAX_JOBS = 100
+
+_USN = re.compile(r"^[0-9A-Z]+$")
+_PHONE = re.compile(r"^[0-9]{10}$")
+_DUPLICATE_KEY = 11000
+
+_hash_pool = ThreadPoolExecutor(max_workers=IMPORT_HASH_WORKERS, thread_name_prefix="import-hash")
+
+
+class ImportFormatError(Exception):
+    """The file is not a usable student CSV"""
+    pass
+
+
+def _validate(row):
+    """Normalized student fields, or an error message"""
+    student = {column: (row.get(column) or "").strip() for column in IMPORT_COLUMNS}
+    student["USN"] = student["USN"].upper()
+
+    missing = [column for column in IMPORT_COLUMNS if not student[column]]
+    if missing:
+        return None, f"Missing {', '.join(missing)}"
+    if not _USN.match(student["USN"]):
+        return None, "USN may only contain letters and digits"
+    if "@" not in student["Email"]:
+        return None, "Invalid email address"
+    if not _PHONE.match(student["Phone"]):
+        return None, "Phone must be a 10-digit number"
+    if len(student["Password"]) < 6:
+        return None, "Password must be at least 6 characters"
+    return student, None
+
+
+def _read_rows(stream):
+    """Yield (line number, row) from a CSV text stream"""
+    reader = csv.DictReader(stream)
+    header = [name.strip() for name in (reader.fieldnames or [])]
+    missing = [column for column in IMPORT_COLUMNS if column not in header]
+    if missing:
+        raise ImportFormatError(f"CSV is missing columns: {', '.join(missing)}")
+    reader.fieldnames = header
+    for row in reader:
+        # Header is line 1
+        yield reader.line_num, row
+
+
+def _write_batch(batch, hashes, college_id, record):
+    """Insert one validated batch and record each row's outcome; returns inserted students"""
+    now = datetime.datetime.now()
+    documents = []
+    for (line, student), password_hash in zip(batch, hashes):
+        documents.append({
+            "USN": student["USN"],
+            "Name": student["Name"],
+            "NameKey": name_key(student["Name"]),
+            "Department": student["Department"],
+            "CollegeID": college_id,
+            "Email": student["Email"],
+            "Phone": student["Phone"],
+            "Password": password_hash,
+            "CreatedAt": now,
+            "Status": "Active"
+        })
+
+    failed = {}
+    try:
+        students_col.insert_many(documents, ordered=False)
+    except BulkWriteError as e:
+        for error in e.details.get("writeErrors", []):
+            if error.get("code") == _DUPLICATE_KEY:
+                failed[error["index"]] = "USN already exists"
+            else:
+                failed[error["index"]] = error.get("errmsg", "Write failed")
+    except Exception as e:
+        logger.error(f"Student import batch failed: {e}")
+        failed = {index: "Database error" for index in range(len(documents))}
+
+    inserted = []
+    for index, (line, student) in enumerate(batch):
+        if index in failed:
+            record({"row": line, "USN": student["USN"], "status": "error", "error": failed[index]})
+        else:
+            record({"row": line, "USN": student["USN"], "status": "created", "error": ""})
+            inserted.append(documents[index])
+    stamp_changes(students_col, [document["_id"] for document in inserted])
+    return inserted
+
+
+def import_students(stream, college_id, batch_size=IMPORT_BATCH_SIZE, workers=None, progress=None):
+    """Import students from a CSV text stream.
+
+    Returns (summary, report) where report has one entry per data row.
+    progress, if given, is called with each report entry as its outcome
+    becomes known. Raises ImportFormatError if the header is unusable.
+    workers runs the import on its own pool of that many threads instead
+    of the shared one.
+    """
+    college_id = college_id.upper()
+    report = []
+    seen = set()
+    created = {}
+
+    def record(entry):
+        report.append(entry)
+        if progress:
+            progress(entry)
+
+    def flush(batch, pool):
+        if not batch:
+            return
+        hashes = list(pool.map(hash_password, [student["Password"] for _, student in batch]))
+        counts = {}
+        for document in _write_batch(batch, hashes, college_id, record):
+            counts[document["Department"]] = counts.get(document["Department"], 0) + 1
+        # Counted per batch so a job that fails later still counts what it created
+        for department, count in counts.items():
+            Stats.increment(college_id, department, students=count)
+            created[department] = created.get(department, 0) + count
+
+    rows = _read_rows(stream)
+    own_pool = ThreadPoolExecutor(max_workers=workers) if workers else None
+    with own_pool or nullcontext(_hash_pool) as pool:
+        batch = []
+        for line, row in rows:
+            student, error = _validate(row)
+            if student and student["USN"] in seen:
+                student, error = None, "Duplicate USN in file"
+            if error:
+                record({"row": line, "USN": (row.get("USN") or "").strip().upper(),
+                        "status": "error", "error": error})
+                continue
+            seen.add(student["USN"])
+            batch.append((line, student))
+            if len(batch) >= batch_size:
+                flush(batch, pool)
+                batch = []
+        flush(batch, pool)
+
+    report.sort(key=lambda entry: entry["row"])
+    summary = {
+        "rows": len(report),
+        "created": sum(created.values()),
+        "errors": sum(1 for entry in report if entry["status"] == "error"),
+    }
+    return summary, report
+
+
+def report_csv(report):
+    """Per-row report as CSV text"""
+    output = io.StringIO()
+    writer = csv.DictWriter(output, fieldnames=["row", "USN", "status", "error"])
+    writer.writeheader()
+    writer.writerows(report)
+    return output.getvalue()
+
+
+def count_rows(csv_path):
+    """Data rows in a CSV file (for progress totals)"""
+    with open(csv_path, "r", newline="", encoding="utf-8-sig") as f:
+        return max(0, sum(1 for row in csv.reader(f) if row) - 1)
+
+
+class ImportJob:
+    """Progress of one background import"""
+
+    def __init__(self, college_id, total):
+        self.id = uuid.uuid4().hex
+        self.college_id = college_id.upper()
+        self.total = total
+        self.processed = 0
+        self.created = 0
+        self.errors = 0
+        self.status = "queued"
+        self.message = ""
+        self.summary = None
+        self.report = []
+        self.created_at = datetime.datetime.now()
+        self.finished_at = None
+        self._lock = Lock()
+
+    def progress(self, entry):
+        with self._lock:
+            # Kept as rows finish, so a failed import still has a partial report
+            self.report.append(entry)
+            self.processed += 1
+            if entry["status"] == "created":
+                self.created += 1
+            else:
+                self.errors += 1
+
+    def sorted_report(self):
+        with self._lock:
+            return sorted(self.report, key=lambda entry: entry["row"])
+
+    def to_dict(self):
+        with self._lock:
+            return {
+                "id": self.id,
+                "status": self.status,
+                "message": self.message,
+                "total": self.total,
+                "processed": self.processed,
+                "created": self.created,
+                "errors": self.errors,
+                "finished": self.status in ("done", "failed"),
+            }
+
+
+_jobs = OrderedDict()
+_jobs_lock = Lock()
+
+
+def _run_job(job, csv_path):
+    job.status = "running"
+    try:
+        with open(csv_path, "r", newline="", encoding="utf-8-sig") as stream:
+            summary, _ = import_students(stream, job.college_id, progress=job.progress)
+        with job._lock:
+            job.summary = summary
+            job.status = "done"
+        AccessLog.log("College", job.college_id, f"Imported students ({summary['created']} created)")
+    except (ImportFormatError, UnicodeDecodeError) as e:
+        job.status, job.message = "failed", f"Could not read CSV: {e}"
+    except Exception:
+        logger.exception(f"Student import {job.id} failed")
+        job.status, job.message = "failed", "Import failed; see the server log"
+        if job.created:
+            AccessLog.log("College", job.college_id,
+                          f"Imported students ({job.created} created, import failed)")
+    finally:
+        job.finished_at = datetime.datetime.now()
+        try:
+            os.remove(csv_path)
+        except OSError:
+            pass
+
+
+def start_job(college_id, csv_path):
+    """Import in a background thread; the uploaded file is deleted afterwards"""
+    job = ImportJob(college_id, count_rows(csv_path))
+    with _jobs_lock:
+        _jobs[job.id] = job
+        while len(_jobs) > MAX_JOBS:
+            oldest = next(iter(_jobs.values()))
+            if not oldest.finished_at:
+                break
+            _jobs.popitem(last=False)
+    Thread(target=_run_job, args=(job, csv_path),
+           name=f"student-import-{job.id[:8]}", daemon=True).start()
+    return job
+
+
+def get_job(job_id, college_id):
+    """A college's import job, or None"""
+    with _jobs_lock:
+        job = _jobs.get(job_id)
+    if job and job.college_id == college_id.upper():
+        return job
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk import students from a CSV file")
+    parser.add_argument("college_id")
+    parser.add_argument("csv_file")
+    parser.add_argument("--report", help="Write the per-row report to this CSV file")
+    parser.add_argument("--workers", type=int, default=None, help="Password hashing threads")
+    args = parser.parse_args()
+
+    print("\n" + "👨‍🎓 BULK STUDENT IMPORT ".center(70, "="))
+    try:
+        with open(args.csv_file, "r", newline="", encoding="utf-8-sig") as f:
+            summary, report = import_students(f, args.college_id, workers=args.workers)
+    except (OSError, ImportFormatError) as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+
+    for entry in report:
+        if entry["status"] == "error":
+            print(f"  ❌ Row {entry['row']} {entry['USN']}: {entry['error']}")
+    print(f"✅ Created {summary['created']} of {summary['rows']} students ({summary['errors']} errors)")
+
+    if args.report:
+        with open(args.report, "w", newline="") as f:
+            f.write(report_csv(report))
+        print(f"✓ Report written to {args.report}")
+    print("=" * 70 + "\n")
+    sys.exit(1 if summary["errors"] else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,24 @@
+import math
+
+import pytest
+
+from feed import poll_timeout
+
+
+@pytest.mark.parametrize("value, expected", [
+    (None, 30),
+    ("", 30),
+    ("abc", 30),
+    ("nan", 30),
+    ("NaN", 30),
+    ("inf", 30),
+    ("-inf", 30),
+    ("-5", 0),
+    ("0", 0),
+    ("12.5", 12.5),
+    ("1e9", 30),
+])
+def test_poll_timeout_is_finite_and_clamped(value, expected):
+    timeout = poll_timeout(value, 30)
+    assert math.isfinite(timeout)
+    assert timeout == expected
@@ -0,0 +1,27 @@
+import base64
+
+import pytest
+from bson import ObjectId
+
+from models import encode_cursor, decode_cursor
+
+
+def _token(text):
+    return base64.urlsafe_b64encode(text.encode()).decode()
+
+
+def test_cursor_round_trip():
+    doc = {"_id": ObjectId(), "Name": "Asha"}
+    assert decode_cursor(encode_cursor(doc, "Name")) == ("Asha", doc["_id"])
+
+
+@pytest.mark.parametrize("token", [
+    "not base64!",
+    _token("not json"),
+    _token("[1]"),
+    _token("5"),
+    _token('[1, {"$oid": "zz"}]'),
+    _token('[{"$date": "bogus"}, 1]'),
+])
+def test_malformed_cursor_is_rejected(token):
+    assert decode_cursor(token) is None
@@ -0,0 +1,74 @@
+import hashlib
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+import chainstore
+from verify_offline import export_headers
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CERT_HASH = "ab" * 32
+
+
+def _mine(index, previous_hash, data):
+    proof = 0
+    while not hashlib.sha256(f"{previous_hash}{data}{proof}".encode()).hexdigest().startswith("0000"):
+        proof += 1
+    return {"index": index, "proof": proof, "previous_hash": previous_hash,
+            "timestamp": "2024-01-01 00:00:00", "data": data}
+
+
+@pytest.fixture
+def headers_file(tmp_path, monkeypatch):
+    manifest = {
+        "Type": chainstore.BATCH_BLOCK_TYPE,
+        "BatchID": "test",
+        "CollegeID": "ABC001",
+        "Certificates": [{"hash": CERT_HASH, "USN": "1AB22CS001", "CollegeID": "ABC001",
+                          "FileSHA256": "cd" * 32}],
+    }
+    genesis = {"index": 1, "proof": 1, "previous_hash": "0",
+               "timestamp": "2024-01-01 00:00:00", "data": "Genesis Block"}
+    chain = [genesis, _mine(2, chainstore.block_hash(genesis), str(manifest))]
+    nodes_dir = tmp_path / "NODES"
+    for node in chainstore.NODE_NAMES:
+        (nodes_dir / node).mkdir(parents=True)
+        (nodes_dir / node / "blockchain.json").write_text(json.dumps(chain))
+    monkeypatch.setattr(chainstore, "NODES_DIR", str(nodes_dir))
+
+    output = str(tmp_path / "headers.json")
+    export = export_headers(output)
+    return output, export["digest"]
+
+
+def _run(*args):
+    return subprocess.run([sys.executable, "verify_offline.py", *args], cwd=PROJECT_DIR,
+                          capture_output=True, text=True)
+
+
+def test_documented_verify_command_line(headers_file):
+    headers, digest = headers_file
+    # verify headers.json --expected-digest <digest> <hash-or-pdf> [...]
+    result = _run("verify", headers, "--expected-digest", digest, CERT_HASH)
+    assert result.returncode == 0, result.stderr
+    assert "VALID" in result.stdout
+
+
+def test_documented_batch_command_line(headers_file, tmp_path):
+    headers, digest = headers_file
+    inputs = tmp_path / "inputs.txt"
+    inputs.write_text(CERT_HASH + "\n")
+    # verify headers.json --expected-digest <digest> --batch inputs.txt --json
+    result = _run("verify", headers, "--expected-digest", digest, "--batch", str(inputs), "--json")
+    assert result.returncode == 0, result.stderr
+    assert json.loads(result.stdout.splitlines()[0])["valid"] is True
+
+
+def test_wrong_digest_is_not_valid(headers_file):
+    headers, _ = headers_file
+    result = _run("verify", headers, "--expected-digest", "0" * 64, CERT_HASH)
+    assert result.returncode == 1
+    assert "FOUND BUT UNTRUSTED" in result.stdout
@@ -0,0 +1,277 @@
+"""
+Offline Certificate Verifier
+Verifies certificates against a header-only export of the blockchain,
+without the Flask app or MongoDB.
+
+Export (run where the NODES directory lives):
+    python verify_offline.py export headers.json
+
+Verify (anywhere, entirely offline):
+    python verify_offline.py verify headers.json --expected-digest <digest> <hash-or-pdf> [...]
+    python verify_offline.py verify headers.json --expected-digest <digest> --batch inputs.txt --json
+
+The export checks every block's proof-of-work and link to its predecessor
+using the full block data, then keeps only the block headers and, for each
+anchored certificate, its hash, USN, college and the SHA-256 of its PDF.
+The verifier re-checks that the headers form an unbroken chain, but the
+export itself cannot prove where it came from: anyone can rewrite headers
+and recompute their hashes and digest. block_hash and the proof-of-work
+hash the full block data, which the export does not carry (each header
+keeps only its SHA-256 as data_sha256, for auditors holding the chain).
+Certificates are therefore only reported valid when --expected-digest,
+the digest published by the issuer, is given and matches the file.
+"""
+
+import argparse
+import base64
+import binascii
+import datetime
+import hashlib
+import json
+import os
+import sys
+
+import chainstore
+from chainstore import (NodeSelector, block_hash, block_certificates, block_payload,
+                        certificate_digest, is_batch_payload, iter_blocks)
+
+HEADER_FORMAT_VERSION = 2
+POW_DIFFICULTY = 4
+
+
+class ExportError(Exception):
+    """Chain failed validation while exporting"""
+    pass
+
+
+def _headers_digest(headers):
+    """Digest over the canonical form of the exported headers"""
+    canonical = json.dumps(headers, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+def export_headers(output, node=None):
+    """Write a header-only export of the chain"""
+    if node is None:
+        majority = NodeSelector().majority()
+        if not majority:
+            raise ExportError("No readable blockchain nodes")
+        node = majority[0]
+
+    headers = []
+    previous = None
+    for block, _, _ in iter_blocks(node):
+        if previous is not None:
+            if block['index'] != previous['index'] + 1:
+                raise ExportError(f"Block {block['index']} does not follow block {previous['index']}")
+            if block['previous_hash'] != block_hash(previous):
+                raise ExportError(f"Block {block['index']} has an invalid previous hash")
+
+        header = {
+            'index': block['index'],
+            'timestamp': block['timestamp'],
+            'previous_hash': block['previous_hash'],
+            'proof': block['proof'],
+            'data_sha256': hashlib.sha256(str(block.get('data', '')).encode()).hexdigest(),
+            'block_hash': block_hash(block),
+            'certificates': [],
+        }
+
+        payload = block_payload(block)
+        certificates = block_certificates(block, payload)
+        if certificates:
+            pow_hash = hashlib.sha256(
+                f"{block['previous_hash']}{block['data']}{block['proof']}".encode()
+            ).hexdigest()
+            if not pow_hash.startswith('0' * POW_DIFFICULTY):
+                raise ExportError(f"Block {block['index']} has an invalid proof-of-work")
+
+        if is_batch_payload(payload):
+            # Batch manifests carry the file digest; the certificate data is in MongoDB
+            for entry in certificates:
+                header['certificates'].append({
+                    'hash': entry['hash'],
+                    'USN': entry.get('USN'),
+                    'CollegeID': entry.get('CollegeID'),
+                    'file_sha256': entry.get('FileSHA256'),
+                })
+        elif certificates:
+            if certificate_digest(payload) != payload['hash']:
+                raise ExportError(f"Block {block['index']} data does not match its certificate hash")
+
+            header['certificates'].append({
+                'hash': payload['hash'],
+                'USN': payload.get('USN'),
+                'CollegeID': payload.get('CollegeID'),
+                'file_sha256': _file_digest(payload.get('CertificateFile')),
+            })
+
+        headers.append(header)
+        previous = block
+
+    export = {
+        'version': HEADER_FORMAT_VERSION,
+        'exported_at': str(datetime.datetime.now()),
+        'node': node,
+        'tip': headers[-1]['block_hash'] if headers else None,
+        'digest': _headers_digest(headers),
+        'headers': headers,
+    }
+
+    temp_output = output + '.tmp'
+    with open(temp_output, 'w') as f:
+        json.dump(export, f, separators=(',', ':'))
+    os.replace(temp_output, output)
+    return export
+
+
+def _file_digest(encoded):
+    """SHA-256 of a base64-encoded certificate file"""
+    if not encoded:
+        return None
+    try:
+        return hashlib.sha256(base64.b64decode(encoded)).hexdigest()
+    except (binascii.Error, ValueError):
+        return None
+
+
+class HeaderIndex:
+    """In-memory lookup over an exported header file"""
+
+    def __init__(self, path, expected_digest=None):
+        with open(path, 'r') as f:
+            export = json.load(f)
+
+        if export.get('version') != HEADER_FORMAT_VERSION:
+            raise ValueError(f"Unsupported header file version: {export.get('version')}")
+
+        self.headers = export['headers']
+        self.digest = export['digest']
+        self.tip = export['tip']
+        self.errors = self._check_chain()
+        # Only a digest obtained from the issuer makes the file trustworthy
+        self.trusted = bool(expected_digest) and expected_digest.strip().lower() == self.digest
+        if expected_digest and not self.trusted:
+            self.errors.append("Header digest does not match the expected digest")
+
+        self.by_hash = {}
+        self.by_file = {}
+        for header in self.headers:
+            for cert in header['certificates']:
+                self.by_hash[cert['hash']] = (header, cert)
+                if cert.get('file_sha256'):
+                    self.by_file[cert['file_sha256']] = (header, cert)
+
+    def _check_chain(self):
+        """Verify digest and header linkage"""
+        errors = []
+        if _headers_digest(self.headers) != self.digest:
+            errors.append("Header digest mismatch: file has been modified")
+        for previous, header in zip(self.headers, self.headers[1:]):
+            if header['index'] != previous['index'] + 1:
+                errors.append(f"Block {header['index']} does not follow block {previous['index']}")
+            if header['previous_hash'] != previous['block_hash']:
+                errors.append(f"Block {header['index']} is not linked to block {previous['index']}")
+        if self.headers and self.tip != self.headers[-1]['block_hash']:
+            errors.append("Tip does not match the last header")
+        return errors
+
+    def verify(self, item):
+        """Verify a certificate hash or a path to a certificate PDF"""
+        if os.path.isfile(item):
+            with open(item, 'rb') as f:
+                file_hash = hashlib.sha256(f.read()).hexdigest()
+            found = self.by_file.get(file_hash)
+        else:
+            found = self.by_hash.get(item.strip().lower())
+
+        result = {
+            'input': item,
+            'found': bool(found),
+            'trusted': self.trusted,
+            'valid': bool(found) and self.trusted and not self.errors,
+        }
+        if found:
+            header, cert = found
+            result.update({
+                'hash': cert['hash'],
+                'USN': cert['USN'],
+                'CollegeID': cert['CollegeID'],
+                'block': header['index'],
+                'block_hash': header['block_hash'],
+                'anchored_at': header['timestamp'],
+            })
+        return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline blockchain certificate verifier")
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    p_export = sub.add_parser('export', help="Write a header-only export of the chain")
+    p_export.add_argument('output')
+    p_export.add_argument('--node', default=None, help="Node to export (default: a majority node)")
+    p_export.add_argument('--nodes-dir', default=chainstore.NODES_DIR)
+
+    p_verify = sub.add_parser('verify', help="Verify certificates against a header export")
+    p_verify.add_argument('headers')
+    p_verify.add_argument('items', nargs='*', help="Certificate hashes or PDF paths")
+    p_verify.add_argument('--batch', help="File with one hash or PDF path per line")
+    p_verify.add_argument('--json', action='store_true', help="Print NDJSON results")
+    p_verify.add_argument('--expected-digest',
+                          help="Header digest published by the issuer; required for a VALID result")
+
+    argv = sys.argv[1:] if argv is None else list(argv)
+    if argv[:1] == ['verify']:
+        # Hashes may follow --expected-digest; a subparser's nargs='*'
+        # positional would already be used up by then, so parse intermixed
+        args = p_verify.parse_intermixed_args(argv[1:])
+        args.command = 'verify'
+    else:
+        args = parser.parse_args(argv)
+
+    if args.command == 'export':
+        chainstore.NODES_DIR = args.nodes_dir
+        try:
+            export = export_headers(args.output, args.node)
+        except ExportError as e:
+            print(f"❌ Export failed: {e}")
+            sys.exit(1)
+        certs = sum(len(h['certificates']) for h in export['headers'])
+        print(f"✓ Exported {len(export['headers'])} headers ({certs} certificates) from {export['node']}")
+        print(f"✓ Digest: {export['digest']}")
+        return
+
+    index = HeaderIndex(args.headers, args.expected_digest)
+    for error in index.errors:
+        print(f"❌ {error}", file=sys.stderr)
+    if not args.expected_digest:
+        print("⚠️  No --expected-digest given: the header file cannot be trusted, "
+              "so no certificate is reported valid", file=sys.stderr)
+    if not args.json:
+        print(f"Header digest: {index.digest}")
+
+    items = list(args.items)
+    if args.batch:
+        with open(args.batch, 'r') as f:
+            items.extend(line.strip() for line in f if line.strip())
+
+    failures = 0
+    for item in items:
+        result = index.verify(item)
+        if not result['valid']:
+            failures += 1
+        if args.json:
+            print(json.dumps(result))
+        elif result['valid']:
+            print(f"✅ VALID  {result['hash']}  USN {result['USN']}  block {result['block']}")
+        elif result['found']:
+            print(f"⚠️  FOUND BUT UNTRUSTED  {result['hash']}  USN {result['USN']}  block {result['block']}")
+        else:
+            print(f"❌ NOT VERIFIED  {item}")
+
+    sys.exit(1 if failures or index.errors else 0)
+
+
+if __name__ == "__main__":
+    main()
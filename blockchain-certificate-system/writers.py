@@ -0,0 +1,238 @@
+"""
+Buffered Writers
+Background writers that keep MongoDB writes off the request thread.
+BufferedWriter batches append-only documents (access logs) into
+insert_many calls; CounterBuffer coalesces counter increments into
+periodic bulk $inc upserts. Both drain when the process exits.
+"""
+
+import atexit
+import datetime
+import logging
+import time
+from collections import deque
+from threading import Condition, Thread
+
+from pymongo import UpdateOne
+
+logger = logging.getLogger(__name__)
+
+# What write() does when the queue is full
+OVERFLOW_POLICIES = ("sync", "block", "drop_newest", "drop_oldest")
+
+
+class BufferedWriter:
+    def __init__(self, collection, batch_size=100, flush_interval=1.0,
+                 max_queue=10000, overflow="sync", block_timeout=1.0, name="buffered-writer",
+                 write_batch=None):
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy: {overflow}")
+        self.collection = collection
+        # Optional callable(batch) replacing the default insert_many
+        self.write_batch = write_batch
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_queue = max_queue
+        self.overflow = overflow
+        self.block_timeout = block_timeout
+        self.name = name
+        self._queue = deque()
+        self._cond = Condition()
+        self._thread = None
+        self._closed = False
+        self._in_flight = 0
+        self._flush_requested = False
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+
+    def _start(self):
+        if self._thread is None:
+            self._thread = Thread(target=self._run, name=self.name, daemon=True)
+            self._thread.start()
+            atexit.register(self.close)
+
+    def write(self, document):
+        """Queue a document for insertion; never waits on MongoDB unless the policy says so"""
+        with self._cond:
+            direct = self._closed
+            if not direct:
+                self._start()
+                if len(self._queue) >= self.max_queue:
+                    if self.overflow == "drop_newest":
+                        self.dropped += 1
+                        return
+                    if self.overflow == "drop_oldest":
+                        self._queue.popleft()
+                        self.dropped += 1
+                    elif self.overflow == "block":
+                        if not self._cond.wait_for(lambda: len(self._queue) < self.max_queue,
+                                                   self.block_timeout):
+                            self.dropped += 1
+                            logger.warning(f"{self.name}: queue full, dropped a document")
+                            return
+                    else:
+                        # "sync": write this document directly
+                        direct = True
+
+            if not direct:
+                self._queue.append(document)
+                if len(self._queue) >= self.batch_size:
+                    self._cond.notify_all()
+                return
+
+        self._insert([document])
+
+    def _take_batch(self):
+        batch = []
+        while self._queue and len(batch) < self.batch_size:
+            batch.append(self._queue.popleft())
+        self._in_flight += len(batch)
+        self._cond.notify_all()
+        return batch
+
+    def _run(self):
+        while True:
+            with self._cond:
+                deadline = time.monotonic() + self.flush_interval
+                while (not self._closed and not self._flush_requested
+                       and len(self._queue) < self.batch_size):
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                if self._closed and not self._queue:
+                    return
+                batch = self._take_batch()
+                if not self._queue:
+                    self._flush_requested = False
+            if batch:
+                self._insert(batch)
+                with self._cond:
+                    self._in_flight -= len(batch)
+                    self._cond.notify_all()
+
+    def _insert(self, batch):
+        try:
+            if self.write_batch:
+                self.write_batch(batch)
+            else:
+                self.collection.insert_many(batch, ordered=False)
+            self.written += len(batch)
+        except Exception as e:
+            self.failed += len(batch)
+            logger.error(f"{self.name}: failed to write {len(batch)} documents: {e}")
+
+    def flush(self, timeout=5.0):
+        """Wait until everything queued so far has been written"""
+        with self._cond:
+            if self._thread is None:
+                return True
+            if self._queue:
+                self._flush_requested = True
+                self._cond.notify_all()
+            return self._cond.wait_for(lambda: not self._queue and not self._in_flight, timeout)
+
+    def close(self, timeout=10.0):
+        """Drain the queue and stop the writer thread"""
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        if self._queue:
+            # Writer thread did not finish in time; write the rest directly
+            with self._cond:
+                batch = list(self._queue)
+                self._queue.clear()
+            self._insert(batch)
+
+    def stats(self):
+        with self._cond:
+            return {
+                "queued": len(self._queue),
+                "written": self.written,
+                "dropped": self.dropped,
+                "failed": self.failed,
+            }
+
+
+class CounterBuffer:
+    """Coalesces increments per key and flushes them as bulk $inc upserts.
+
+    Hot keys cost one write per flush interval instead of one per event.
+    """
+
+    def __init__(self, collection, field="Count", flush_interval=5.0, max_keys=100000,
+                 name="counter-buffer"):
+        self.collection = collection
+        self.field = field
+        self.flush_interval = flush_interval
+        self.max_keys = max_keys
+        self.name = name
+        self._counts = {}
+        self._cond = Condition()
+        self._thread = None
+        self._closed = False
+        self.flushed = 0
+        self.failed = 0
+
+    def _start(self):
+        if self._thread is None:
+            self._thread = Thread(target=self._run, name=self.name, daemon=True)
+            self._thread.start()
+            atexit.register(self.close)
+
+    def add(self, key, amount=1):
+        with self._cond:
+            if self._closed:
+                return
+            self._start()
+            self._counts[key] = self._counts.get(key, 0) + amount
+            if len(self._counts) >= self.max_keys:
+                self._cond.notify_all()
+
+    def pending(self, key):
+        """Increments for key not yet written"""
+        with self._cond:
+            return self._counts.get(key, 0)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._closed or len(self._counts) >= self.max_keys,
+                                    self.flush_interval)
+                closed = self._closed
+            self.flush()
+            if closed:
+                return
+
+    def flush(self):
+        """Write the accumulated increments"""
+        with self._cond:
+            counts, self._counts = self._counts, {}
+        if not counts:
+            return
+        now = datetime.datetime.now()
+        operations = [
+            UpdateOne({"_id": key}, {"$inc": {self.field: amount}, "$max": {"LastAt": now}}, upsert=True)
+            for key, amount in counts.items()
+        ]
+        try:
+            self.collection.bulk_write(operations, ordered=False)
+            self.flushed += len(operations)
+        except Exception as e:
+            self.failed += len(operations)
+            logger.error(f"{self.name}: failed to flush {len(operations)} counters: {e}")
+
+    def close(self, timeout=10.0):
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self.flush()